@@ -0,0 +1,164 @@
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glob import glob
+from os import makedirs
+from os.path import isdir, isfile, basename, dirname, join, abspath
+from typing import List, Dict, Tuple, Optional, Any
+
+from pddl_parser.pddl_parser import PddlProblemParser, parse_plan
+from main import solve_pddl_problem
+from planners.plan_cache import PlanCache
+from planners.translation_cache import TranslationCache
+
+def discover_configs(patterns: List[str]) -> List[Tuple[str, str]]:
+    """
+        Expand directory patterns such as config/problem_configs/* into (config_name, config_path) pairs,
+        keeping only directories that contain both an init.yaml and a goal.yaml.
+    """
+    configs = []
+
+    for pattern in patterns:
+        for config_dir in sorted(glob(pattern.rstrip("/"))):
+            if not isdir(config_dir):
+                continue
+
+            if isfile(join(config_dir, "init.yaml")) and isfile(join(config_dir, "goal.yaml")):
+                configs.append((basename(config_dir), dirname(config_dir) + "/"))
+
+    return configs
+
+def run_scenario(config_name: str,
+                 problem_config_path: str,
+                 work_dir: str,
+                 solver: str = "downward",
+                 domain_name: str = "blocks",
+                 action_costs: bool = False,
+                 plan_cache: Optional[str] = None,
+                 translation_cache: Optional[str] = None,
+                 time_limit: Optional[float] = None) -> Dict[str, Any]:
+    """
+        Problems and plans go to `work_dir` instead of pddl_worlds/ and plans/. Configs of the same name in
+        different directories get different problem names, so parallel workers never share files.
+    """
+    path_hash = hashlib.sha1(abspath(f"{problem_config_path}{config_name}").encode()).hexdigest()[:8]
+    problem_name = f"{domain_name}_{config_name}_{path_hash}"
+    result: Dict[str, Any] = {"config": config_name, "config_path": problem_config_path, "problem": problem_name,
+                              "solver": solver, "times": {}}
+
+    try:
+        start = time.perf_counter()
+        pp = PddlProblemParser(config_name, domain_name, problem_config_path=problem_config_path, action_costs=action_costs)
+        pp.define_problem(problem_name=problem_name).save(f"{work_dir}{problem_name}.pddl")
+        result["times"]["define_problem"] = time.perf_counter() - start
+
+        # Every worker opens the shared cache directory itself
+        cache = None if plan_cache is None else PlanCache(plan_cache)
+        translations = None if translation_cache is None else TranslationCache(translation_cache)
+
+        start = time.perf_counter()
+        plan_file = solve_pddl_problem(domain_name, problem_name, solver=solver, plan_dir=f"{work_dir}plans/",
+                                       action_costs=action_costs, cache=cache, translation_cache=translations,
+                                       time_limit=time_limit, problem_dir=work_dir)
+        result["times"]["solve"] = time.perf_counter() - start
+        result["cached"] = plan_file is not None and basename(plan_file) == "plan_cached.1"
+
+        if translations is not None:
+            result["translation"] = translations.stats()
+
+        start = time.perf_counter()
+        plan = parse_plan(plan_file) if plan_file is not None else None
+        result["times"]["parse_plan"] = time.perf_counter() - start
+
+        # The planners give up early on unsolvable problems, so running into the limit means a timeout
+        if plan is not None:
+            result["status"] = "solved"
+        elif time_limit is not None and result["times"]["solve"] >= time_limit:
+            result["status"] = "timeout"
+        else:
+            result["status"] = "unsolved"
+
+        result["plan_file"] = plan_file
+        result["plan_length"] = None if plan is None else len(plan)
+
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["traceback"] = traceback.format_exc()
+
+    return result
+
+def run_batch(configs: List[Tuple[str, str]],
+              solver: str = "downward",
+              max_workers: Optional[int] = None,
+              summary_file: str = "batch_summary.json",
+              action_costs: bool = False,
+              plan_cache: Optional[str] = None,
+              translation_cache: Optional[str] = None,
+              time_limit: Optional[float] = None,
+              work_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    results = []
+    start = time.perf_counter()
+
+    # Generated problems and plans stay out of the source tree
+    work_dir = (tempfile.mkdtemp(prefix="batch_") if work_dir is None else work_dir).rstrip("/") + "/"
+    makedirs(work_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(run_scenario, config_name, config_path, work_dir, solver, action_costs=action_costs,
+                               plan_cache=plan_cache, translation_cache=translation_cache, time_limit=time_limit)
+                   for config_name, config_path in configs]
+
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"[{len(results)}/{len(configs)}] {result['config']}: {result['status']}")
+
+    results.sort(key=lambda r: (r["config"], r["config_path"]))
+    statuses = [r["status"] for r in results]
+
+    summary = {
+        "solver": solver,
+        "work_dir": work_dir,
+        "scenarios": len(results),
+        "solved": statuses.count("solved"),
+        "unsolved": statuses.count("unsolved"),
+        "timeouts": statuses.count("timeout"),
+        "errors": statuses.count("error"),
+        "cache_hits": sum(1 for r in results if r.get("cached")),
+        "translation_hits": sum(r.get("translation", {}).get("hits", 0) for r in results),
+        "translation_misses": sum(r.get("translation", {}).get("misses", 0) for r in results),
+        "wall_time": time.perf_counter() - start,
+        "results": results,
+    }
+
+    with open(summary_file, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    return results
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Generate, solve and parse many problem configs in parallel.")
+    arg_parser.add_argument("configs", nargs="*", default=["config/problem_configs/*"], help="Config directories or glob patterns")
+    arg_parser.add_argument("--solver", default="downward")
+    arg_parser.add_argument("--workers", type=int, default=None)
+    arg_parser.add_argument("--summary", default="batch_summary.json")
+    arg_parser.add_argument("--action-costs", action="store_true", help="Make moves cost their travel distance")
+    arg_parser.add_argument("--plan-cache", default=None, help="Directory of cached plans shared between runs")
+    arg_parser.add_argument("--translation-cache", default=None, help="Directory of cached Fast Downward translations")
+    arg_parser.add_argument("--time-limit", type=float, default=300.0, help="Planner time limit per scenario, in seconds")
+    arg_parser.add_argument("--work-dir", default=None, help="Directory for generated problems and plans, a new temporary one by default")
+    args = arg_parser.parse_args()
+
+    configs = discover_configs(args.configs)
+    run_batch(configs, solver=args.solver, max_workers=args.workers, summary_file=args.summary,
+              action_costs=args.action_costs, plan_cache=args.plan_cache, translation_cache=args.translation_cache,
+              time_limit=args.time_limit, work_dir=args.work_dir)
+
+if __name__ == "__main__":
+    main()
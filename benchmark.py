@@ -0,0 +1,323 @@
+import io
+import json
+import time
+import shutil
+import signal
+import resource
+import argparse
+import tempfile
+import traceback
+import contextlib
+import subprocess
+import tracemalloc
+import multiprocessing as mp
+import numpy as np
+
+from dataclasses import dataclass, field
+from glob import glob
+from os import remove, makedirs, setsid, killpg
+from queue import Empty
+from typing import List, Dict, Optional, Any, Callable
+
+from yaml import safe_load
+
+from pddl_parser.scenario_generator import ScenarioSpec, generate_scenario
+
+STAGES = ["define_problem", "solve", "parse_plan", "simulate", "parse_states", "dynamic_tree_search"]
+
+@dataclass
+class BenchmarkScenario:
+    name: str
+    init_config: Dict
+    goal_config: Dict
+    num_blocks: int = 0
+
+    def __post_init__(self):
+        self.num_blocks = len([obj for obj in self.init_config if obj.startswith("block")])
+
+@dataclass
+class StageRecorder:
+    """
+        Times pipeline stages inside the benchmark worker and streams every result back to the parent,
+        so stages finished before a timeout are still reported. ru_maxrss never goes down, so
+        `process_peak_rss_mb` is the peak of the worker up to the end of a stage. The per stage peak is
+        `peak_traced_mb`, which needs `trace_memory`.
+    """
+    queue: Any
+    trace_memory: bool = False
+    results: Dict[str, Dict[str, Any]] = field(default_factory=lambda: {})
+
+    def run(self, stage: str, fn: Callable[[], Any]) -> Any:
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        value = fn()
+        result: Dict[str, Any] = {"time": time.perf_counter() - start,
+                                  "process_peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+        if self.trace_memory:
+            result["peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+
+        self.results[stage] = result
+        self.queue.put((stage, result))
+        return value
+
+def load_config_scenario(config_name: str, problem_config_path: str = "config/problem_configs/") -> BenchmarkScenario:
+    with open(f"{problem_config_path}{config_name}/init.yaml", 'r') as f:
+        init_config = safe_load(f)
+
+    with open(f"{problem_config_path}{config_name}/goal.yaml", 'r') as f:
+        goal_config = safe_load(f)
+
+    return BenchmarkScenario(config_name, init_config, goal_config)
+
+def generated_scenario(num_blocks: int, seed: int = 0) -> BenchmarkScenario:
+    spec = ScenarioSpec(num_blocks=num_blocks,
+                        num_stacks=max(1, num_blocks // 5),
+                        max_height=10,
+                        num_static=1,
+                        seed=seed)
+
+    init_config, goal_config = generate_scenario(spec)
+    return BenchmarkScenario(f"gen_{num_blocks}", init_config, goal_config)
+
+def problem_file_name(scenario: BenchmarkScenario) -> str:
+    return f"bench_{scenario.name}"
+
+def run_pipeline(scenario: BenchmarkScenario,
+                 stages: List[str],
+                 solver: str,
+                 recorder: StageRecorder,
+                 dispatcher_kwargs: Dict[str, Any],
+                 plan_dir: str) -> None:
+    # Imported here so that every worker process pays for its own imports outside of the timed stages
+    from pddl_parser.pddl_parser import PddlProblemParser, parse_plan
+    from pddl_parser.problem_parser import parse_config_to_states
+    from dispatcher.dispatcher import CommandDispatcher
+    from d_lgp.dynamic_logic_geometric_programmer import dynamic_tree_search
+    from main import solve_pddl_problem
+
+    problem_name = problem_file_name(scenario)
+    makedirs(f"{plan_dir}{problem_name}", exist_ok=True)
+    pp, plan_file, plan = None, None, None
+
+    if "define_problem" in stages:
+        pp = PddlProblemParser(scenario.name, "blocks", init_config=scenario.init_config, goal_config=scenario.goal_config)
+        recorder.run("define_problem", lambda: pp.define_problem(problem_name=problem_name, save=True))
+
+    if "solve" in stages and pp is not None:
+        plan_file = recorder.run("solve", lambda: solve_pddl_problem("blocks", problem_name, solver=solver, plan_dir=plan_dir))
+
+    if "parse_plan" in stages and "solve" in recorder.results:
+        plan = recorder.run("parse_plan", lambda: None if plan_file is None else parse_plan(plan_file))
+
+        if plan is None:
+            recorder.queue.put(("no_plan", {"error": f"{solver} found no plan"}))
+
+    if "simulate" in stages and plan is not None:
+        def simulate():
+            cd = CommandDispatcher(pp.init_predicates, pp.positions, **dispatcher_kwargs)
+            cd.initialize_objects()
+            return cd.run_simulation(plan)
+
+        recorder.run("simulate", simulate)
+
+    if "parse_states" in stages or "dynamic_tree_search" in stages:
+        states = recorder.run("parse_states", lambda: parse_config_to_states(scenario.name,
+                                                                             init_config=scenario.init_config,
+                                                                             goal_config=scenario.goal_config))
+
+        if "dynamic_tree_search" in stages:
+            states.initialize_states()
+            recorder.run("dynamic_tree_search", lambda: dynamic_tree_search(states))
+
+def benchmark_worker(scenario: BenchmarkScenario,
+                     stages: List[str],
+                     solver: str,
+                     trace_memory: bool,
+                     dispatcher_kwargs: Dict[str, Any],
+                     plan_dir: str,
+                     queue) -> None:
+    # Own process group, so that a timeout also kills the planner processes started by the solve stage
+    setsid()
+    recorder = StageRecorder(queue, trace_memory)
+
+    if trace_memory:
+        tracemalloc.start()
+
+    try:
+        # The pipeline prints whole problems and plans, which would only add noise to the timings
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_pipeline(scenario, stages, solver, recorder, dispatcher_kwargs, plan_dir)
+    except Exception as e:
+        queue.put(("error", {"error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}))
+
+    queue.put(None)
+
+def run_isolated(scenario: BenchmarkScenario,
+                 stages: List[str],
+                 solver: str,
+                 trace_memory: bool,
+                 dispatcher_kwargs: Dict[str, Any],
+                 timeout: float) -> Dict[str, Dict[str, Any]]:
+    """
+        One repetition in a fresh process. The pypddl predicates cache their evaluations at module level,
+        so runs sharing a process would not be independent. Files are cleaned up here, as a worker killed
+        on timeout never gets to.
+    """
+    plan_dir = tempfile.mkdtemp(prefix="bench_plans_") + "/"
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=benchmark_worker,
+                          args=(scenario, stages, solver, trace_memory, dispatcher_kwargs, plan_dir, queue),
+                          daemon=False)
+    process.start()
+
+    results = {}
+    deadline = time.perf_counter() + timeout
+
+    try:
+        while True:
+            item = queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+            if item is None:
+                break
+
+            stage, result = item
+            results[stage] = result
+    except Empty:
+        results["timeout"] = {"error": f"Timed out after {timeout}s"}
+    finally:
+        if process.is_alive():
+            try:
+                killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                # Killed before it got to start its own group
+                process.kill()
+
+        process.join()
+        shutil.rmtree(plan_dir, ignore_errors=True)
+
+        for problem_file in glob(f"pddl_worlds/blocks/{problem_file_name(scenario)}.pddl"):
+            remove(problem_file)
+
+    return results
+
+def summarize(runs: List[Dict[str, Dict[str, Any]]], stages: List[str]) -> Dict[str, Dict[str, Any]]:
+    summary = {}
+
+    for stage in stages:
+        stage_runs = [run[stage] for run in runs if stage in run]
+        if stage_runs == []:
+            continue
+
+        times = np.array([r["time"] for r in stage_runs])
+        summary[stage] = {
+            "runs": len(stage_runs),
+            "median": float(np.median(times)),
+            "p95": float(np.percentile(times, 95)),
+            "min": float(times.min()),
+            "process_peak_rss_mb": max(r["process_peak_rss_mb"] for r in stage_runs),
+        }
+
+        if "peak_traced_mb" in stage_runs[0]:
+            summary[stage]["peak_traced_mb"] = max(r["peak_traced_mb"] for r in stage_runs)
+
+    return summary
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(scenarios: List[BenchmarkScenario],
+                   stages: List[str] = STAGES,
+                   solver: str = "gbfs",
+                   repeat: int = 3,
+                   timeout: float = 300.0,
+                   trace_memory: bool = False,
+                   dispatcher_kwargs: Optional[Dict[str, Any]] = None,
+                   output_file: Optional[str] = None) -> Dict[str, Any]:
+    kwargs = {"gui": False, "realtime": False, "drive_robot": False}
+    kwargs.update(dispatcher_kwargs or {})
+
+    report: Dict[str, Any] = {
+        "commit": current_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "solver": solver,
+        "repeat": repeat,
+        "dispatcher_kwargs": kwargs,
+        "scenarios": {},
+    }
+
+    for scenario in scenarios:
+        runs = []
+
+        for i in range(repeat):
+            runs.append(run_isolated(scenario, stages, solver, trace_memory, kwargs, timeout))
+            print(f"{scenario.name} [{i+1}/{repeat}]: " + ", ".join(f"{s} {r['time']:.3f}s" if "time" in r else r["error"][:120]
+                                                                   for s, r in runs[-1].items()))
+
+        errors = [run[key]["error"] for run in runs for key in ("no_plan", "error", "timeout") if key in run]
+        report["scenarios"][scenario.name] = {
+            "blocks": scenario.num_blocks,
+            "stages": summarize(runs, stages),
+            "errors": errors,
+        }
+
+    if output_file is not None:
+        with open(output_file, "w") as f:
+            json.dump(report, f, indent=2)
+
+    return report
+
+def compare_reports(baseline: Dict[str, Any], report: Dict[str, Any]) -> None:
+    print(f"Median times, {baseline.get('commit')} -> {report.get('commit')}")
+
+    for name, scenario in report["scenarios"].items():
+        base_stages = baseline["scenarios"].get(name, {}).get("stages", {})
+
+        for stage, summary in scenario["stages"].items():
+            if stage not in base_stages:
+                continue
+
+            before, after = base_stages[stage]["median"], summary["median"]
+            print(f"  {name:>16} {stage:>20}: {before:9.4f}s -> {after:9.4f}s ({after / before if before > 0 else float('inf'):.2f}x)")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Time the generate, solve, parse and simulate pipeline per stage.")
+    arg_parser.add_argument("--configs", nargs="*", default=[], help="Hand-written configs under config/problem_configs/")
+    arg_parser.add_argument("--sizes", nargs="*", type=int, default=[], help="Block counts of generated scenarios")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--stages", nargs="*", default=STAGES, choices=STAGES)
+    arg_parser.add_argument("--solver", default="gbfs")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--timeout", type=float, default=300.0, help="Per repetition, in seconds")
+    arg_parser.add_argument("--trace-memory", action="store_true", help="Also report the tracemalloc peak per stage")
+    arg_parser.add_argument("--drive", action="store_true", help="Drive the robot in the simulate stage instead of teleporting it")
+    arg_parser.add_argument("--output", default="benchmark_results.json")
+    arg_parser.add_argument("--compare", default=None, help="Earlier results file to compare median times against")
+    args = arg_parser.parse_args()
+
+    scenarios = [load_config_scenario(config) for config in args.configs]
+    scenarios += [generated_scenario(size, args.seed) for size in args.sizes]
+
+    if scenarios == []:
+        scenarios = [load_config_scenario("basic")]
+
+    report = run_benchmarks(scenarios,
+                            stages=args.stages,
+                            solver=args.solver,
+                            repeat=args.repeat,
+                            timeout=args.timeout,
+                            trace_memory=args.trace_memory,
+                            dispatcher_kwargs={"drive_robot": args.drive},
+                            output_file=args.output)
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            compare_reports(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
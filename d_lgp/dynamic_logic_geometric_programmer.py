@@ -41,8 +41,8 @@ def conflict_driven_task_graph(states: States, action_skeleton: List, goals: Lis
     action_skeleton.append({'action': action, 'args': input_args})
     goals.append(goal_state)
 
-    action_results = action(**input_args)
-    conflicts = [precond for precond in action_results.failed_preconds.items()]
+    failed_preconds = action.failed_preconditions(**input_args) # type: ignore
+    conflicts = [precond for precond in failed_preconds.items()]
 
     while conflicts != []:
         selected_conflict = conflicts[0]
@@ -55,13 +55,14 @@ def conflict_driven_task_graph(states: States, action_skeleton: List, goals: Lis
 
         args['state'] = current_state # type: ignore
 
-        action_results = a_r(**args)
-        new_conflicts = [preconds for preconds in action_results.failed_preconds.items()]
+        failed_preconds = a_r.failed_preconditions(**args) # type: ignore
+        new_conflicts = [preconds for preconds in failed_preconds.items()]
 
         if new_conflicts:
             for i, conflict in enumerate(new_conflicts):
                 conflicts.insert(i, conflict)
         else:
+            action_results = a_r(**args)
             action_skeleton.insert(len(action_skeleton)-1, {'action': a_r, 'args': args})
             goals.insert(len(goals)-1, current_state)
             states.update_states(action_results.new_state)
@@ -0,0 +1,211 @@
+import time
+import asyncio
+
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Optional
+
+from dispatcher.dispatcher import CommandDispatcher
+from planners.planners import GroundedTask, ground_task
+from planners.solver import PlanStream, PlanResult, domain_path
+from planners.portfolio import Plan, move_costs, plan_cost
+
+@dataclass
+class PlanSwitch:
+    commands_executed: int
+    plan_index: int
+    # Cost left to the goal on the old and on the new plan
+    remaining_before: int
+    remaining_after: int
+
+@dataclass
+class AnytimeReport:
+    success: bool
+    status: str
+    commands_executed: int = 0
+    plans_received: int = 0
+    # Seconds from the start of the run until the first plan was dispatched
+    first_plan_latency: Optional[float] = None
+    final_plan_index: Optional[int] = None
+    switches: List[PlanSwitch] = field(default_factory=lambda: [])
+
+def plan_states(task: GroundedTask, plan: Plan) -> Optional[List[int]]:
+    """
+        States along `plan` from the initial state, None when the plan is not executable or misses the goal.
+    """
+    operators = {(op.name, tuple(op.args)): op for op in task.operators}
+    states = [task.init]
+
+    for cmd, args in plan:
+        op = operators.get((cmd, tuple(args)))
+
+        if op is None or not op.applicable(states[-1]):
+            return None
+
+        states.append(op.apply(states[-1]))
+
+    return states if task.goal_reached(states[-1]) else None
+
+@dataclass
+class ActivePlan:
+    result: PlanResult
+    states: List[int]
+    # Index of the next command to dispatch
+    position: int = 0
+
+    def remaining_cost(self, costs: Dict[Tuple[str, str], int]) -> int:
+        return plan_cost(self.result.plan[self.position:], costs)
+
+@dataclass
+class AnytimeExecutor:
+    """
+        Dispatch the first plan of an anytime planner as soon as it is written and keep watching for better
+        ones. Command boundaries are the safe points: a newer plan takes over when the symbolic state reached
+        so far lies on its trajectory and its remaining suffix is cheaper. Plans are grounded against `task`,
+        which is built from the stream's own domain and problem files when not given.
+    """
+    dispatcher: CommandDispatcher
+    task: Optional[GroundedTask] = None
+    duration: int = 0
+    disconnect: bool = True
+    # Move costs of action cost streams, suffixes of unit cost plans cost their length
+    costs: Dict[Tuple[str, str], int] = field(default_factory=lambda: {})
+
+    async def watch(self, stream: PlanStream, plans: asyncio.Queue) -> None:
+        try:
+            while True:
+                running = stream.running()
+
+                for result in stream.poll():
+                    await plans.put(result)
+
+                if not running:
+                    break
+
+                await asyncio.sleep(stream.poll_interval)
+        finally:
+            await plans.put(None)
+
+    def activate(self, result: PlanResult) -> Optional[ActivePlan]:
+        states = plan_states(self.task, result.plan)
+
+        if states is None:
+            print(f"Discarding invalid plan {result.index}")
+            return None
+
+        return ActivePlan(result, states)
+
+    def try_switch(self, active: ActivePlan, candidate: ActivePlan, report: AnytimeReport) -> ActivePlan:
+        # The latest occurrence of the current state leaves the cheapest suffix
+        positions: Dict[int, int] = {state: i for i, state in enumerate(candidate.states)}
+        position = positions.get(active.states[active.position])
+
+        if position is None:
+            return active
+
+        remaining_before = active.remaining_cost(self.costs)
+        remaining_after = plan_cost(candidate.result.plan[position:], self.costs)
+
+        if remaining_after >= remaining_before:
+            return active
+
+        candidate.position = position
+        report.switches.append(PlanSwitch(report.commands_executed, candidate.result.index, remaining_before, remaining_after))
+        print(f"Switching to plan {candidate.result.index} after {report.commands_executed} commands: "
+              f"{remaining_before} -> {remaining_after} cost left")
+
+        return candidate
+
+    async def run(self, stream: PlanStream) -> AnytimeReport:
+        start = time.perf_counter()
+        report = AnytimeReport(False, "unsolved")
+        plans: asyncio.Queue = asyncio.Queue()
+
+        if stream.job is None:
+            stream.start()
+
+        watcher = asyncio.create_task(self.watch(stream, plans))
+        start_step = self.dispatcher.sim_step
+
+        try:
+            # Grounding overlaps with the search, the watcher keeps collecting plans meanwhile
+            if self.task is None:
+                # The grounder cannot read the action cost domain, its plans are checked against the unit cost one
+                domain_file = domain_path(stream.domain_name) if stream.action_costs else stream.domain_file
+                self.task = await asyncio.to_thread(ground_task, domain_file, stream.problem_file)
+
+            if stream.action_costs:
+                self.costs = move_costs(stream.problem_file)
+
+            active = await self.first_plan(plans, report)
+
+            if active is None:
+                report.status = "timeout" if stream.timed_out else "unsolved"
+                print(f"No valid plan found ({report.status})")
+            else:
+                report.first_plan_latency = time.perf_counter() - start
+                start_step = self.dispatcher.start_execution()
+                await self.execute(active, plans, report, start_step)
+        finally:
+            watcher.cancel()
+            await asyncio.gather(watcher, return_exceptions=True)
+            stream.stop()
+
+        self.dispatcher.finish_execution(start_step, self.duration, self.disconnect)
+        return report
+
+    async def first_plan(self, plans: asyncio.Queue, report: AnytimeReport) -> Optional[ActivePlan]:
+        while True:
+            result = await plans.get()
+
+            if result is None:
+                return None
+
+            report.plans_received += 1
+            active = self.activate(result)
+
+            if active is not None:
+                return active
+
+    async def execute(self, active: ActivePlan, plans: asyncio.Queue, report: AnytimeReport, start_step: int) -> None:
+        watching = True
+        report.success = True
+
+        while active.position < len(active.result.plan):
+            if self.duration != 0 and self.dispatcher.sim_step - start_step >= self.duration:
+                break
+
+            while watching and not plans.empty():
+                result = plans.get_nowait()
+
+                if result is None:
+                    watching = False
+                    continue
+
+                report.plans_received += 1
+                candidate = self.activate(result)
+                if candidate is not None:
+                    active = self.try_switch(active, candidate, report)
+
+            cmd, args = active.result.plan[active.position]
+            success = self.dispatcher.dispatch_command(report.commands_executed, cmd, args, start_step)
+            report.success = success and report.success
+            report.commands_executed += 1
+            active.position += 1
+
+            if self.dispatcher.monitor and not success:
+                report.status = "diverged"
+                break
+
+            # Lets the watcher pick up plans written while the command ran
+            await asyncio.sleep(0)
+
+        # A run cut short by `duration` is interrupted, one with failed commands failed
+        if report.status != "diverged":
+            finished = active.position == len(active.result.plan)
+            report.status = ("solved" if report.success else "failed") if finished else "interrupted"
+
+        report.success = report.status == "solved"
+        report.final_plan_index = active.result.index
+
+def run_anytime(dispatcher: CommandDispatcher, stream: PlanStream, **kwargs) -> AnytimeReport:
+    return asyncio.run(AnytimeExecutor(dispatcher, **kwargs).run(stream))
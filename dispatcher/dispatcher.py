@@ -1,14 +1,65 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 from itertools import cycle
+from dataclasses import dataclass, field
 from pddl.logic import Constant, Predicate
 from pddl_parser.pddl_parser import Object, PositionObject
+from dispatcher.snapshots import Snapshot, SnapshotBuffer, STATE_SIZE
+from dispatcher.motion import DifferentialDrive, DriveConfig, MoveResult, Waypoint, plan_path
 
+import numpy as np
 import pybullet as p
 import time
 import pybullet_data
 
+@dataclass
+class EntityTemplate:
+    urdf: str
+    mass: float
+    lateral_friction: float
+    collision_shape: Optional[int] = None
+    visual_shape: Optional[int] = None
+
+def shape_geometry(geom_type: int, dims: Tuple[float, ...], file_name: bytes) -> Dict:
+    """
+        Map the dimensions reported by getCollisionShapeData/getVisualShapeData to create*Shape arguments.
+    """
+    match geom_type:
+        case p.GEOM_BOX:
+            return {"halfExtents": [d / 2 for d in dims]}
+        case p.GEOM_SPHERE:
+            return {"radius": dims[0]}
+        case p.GEOM_CYLINDER | p.GEOM_CAPSULE:
+            return {"radius": dims[1], "height": dims[0]}
+        case p.GEOM_MESH:
+            return {"fileName": file_name.decode(), "meshScale": dims}
+        case _:
+            raise NotImplementedError(f"Unsupported geometry type {geom_type}")
+
+@dataclass
+class ExecutionReport:
+    success: bool
+    commands_executed: int
+    divergent_step: Optional[int] = None
+    divergent_command: Optional[Tuple[str, List[str]]] = None
+    position_errors: Dict[str, float] = field(default_factory=lambda: {})
+    execution_time: float = 0.0
+
 class CommandDispatcher:
-    def __init__(self, init_predicates: List[Predicate], positions: Dict[str, PositionObject]) -> None:
+    def __init__(self, init_predicates: List[Predicate],
+                       positions: Dict[str, PositionObject],
+                       gui: bool = True,
+                       realtime: Optional[bool] = None,
+                       steps_per_command: int = 1,
+                       run_until_settled: bool = False,
+                       settle_tolerance: float = 1e-3,
+                       max_settle_steps: int = 2400,
+                       record_interval: int = 0,
+                       record_capacity: int = 1024,
+                       monitor: bool = False,
+                       position_tolerance: float = 0.25,
+                       drive_robot: bool = True,
+                       drive_config: Optional[DriveConfig] = None,
+                       path_clearance: float = 1.1) -> None:
         self.objects = []
         self.init_predicates = init_predicates
         self.positions = positions
@@ -18,17 +69,55 @@ class CommandDispatcher:
         self.object_entity_dict = {}
         self.entity_ids = []
 
-        self.physicsClient = p.connect(p.GUI)
+        # Bodies are parked out of the way and reused instead of being removed and reloaded
+        self.entity_templates: Dict[str, EntityTemplate] = {}
+        self.body_pool: Dict[str, List[int]] = {}
+        self.parking_position = [0.0, 0.0, -100.0]
+
+        # Headless runs use DIRECT and step as fast as possible, GUI runs default to real time
+        self.gui = gui
+        self.realtime = gui if realtime is None else realtime
+        self.time_step = 1./240.
+        self.steps_per_command = steps_per_command
+        self.run_until_settled = run_until_settled
+        self.settle_tolerance = settle_tolerance
+        self.max_settle_steps = max_settle_steps
+
+        # Snapshots are recorded every `record_interval` steps once the objects exist, 0 disables recording
+        self.sim_step = 0
+        self.record_interval = record_interval
+        self.record_capacity = record_capacity
+        self.snapshot_buffer: Optional[SnapshotBuffer] = None
 
-        p.setAdditionalSearchPath(pybullet_data.getDataPath())
-        p.setGravity(0, 0, -9.81)
-        p.loadURDF("plane.urdf")
+        # The monitor settles after every command and stops at the first body that misses its expected position
+        self.monitor = monitor
+        self.position_tolerance = position_tolerance
+        self.object_index: Dict[str, int] = {}
+        self.held_objects: Dict[str, str] = {}
+        self.expected_positions = np.zeros((0, 3))
+        self.execution_report: Optional[ExecutionReport] = None
+
+        self.physicsClient = p.connect(p.GUI if gui else p.DIRECT)
+
+        # Every call is scoped to this client so several dispatchers can share a process
+        p.setAdditionalSearchPath(pybullet_data.getDataPath(), physicsClientId=self.physicsClient)
+        p.setGravity(0, 0, -9.81, physicsClientId=self.physicsClient)
+        p.loadURDF("plane.urdf", physicsClientId=self.physicsClient)
+        self.load_entity_templates()
 
         self.robot_wheel_joints = {2: 'right_front_wheel_joint',
                                    3: 'right_back_wheel_joint',
                                    6: 'left_front_wheel_joint',
                                    7: 'left_back_wheel_joints'}
 
+        # Moves drive the wheels along a path unless the robot is teleported like before
+        self.drive_robot = drive_robot
+        self.drive_config = drive_config or DriveConfig()
+        self.approach_offset = 1.2
+        self.path_clearance = path_clearance
+        self.drives: Dict[int, DifferentialDrive] = {}
+        self.move_results: List[MoveResult] = []
+
     def initialize_objects(self) -> None:
         for pred in self.init_predicates:
             if pred.name == "at":
@@ -38,80 +127,330 @@ class CommandDispatcher:
                 pos = self.positions[pos_name].pos
 
                 urdf_key = obj.split("_")[0]
-                entity_id = p.loadURDF(self.entity_urdf_dict[urdf_key], pos, self.default_orientation)
-                self.entity_ids.append(entity_id)
-                self.object_entity_dict[obj] = entity_id
+                self.object_entity_dict[obj] = self.spawn_entity(urdf_key, pos)
+
+        self.object_index = {obj: i for i, obj in enumerate(self.objects)}
+        self.expected_positions = self.read_states()[:, 0:3].copy()
 
-    def run_simulation(self, commands: List[Tuple[str, List[str]]], duration: int = 0) -> None:
-        for entity in self.entity_ids:
-            pos, orn = p.getBasePositionAndOrientation(entity)
-            print(self.objects[entity-1], pos, orn)
+        if self.record_interval > 0:
+            self.snapshot_buffer = SnapshotBuffer(list(self.objects), self.record_capacity, self.record_interval)
 
-        time.sleep(2.0)
+    def load_entity_templates(self) -> None:
+        """
+            Parse every URDF once. Single-link entities get shared collision and visual shapes so new
+            bodies are built with createMultiBody, articulated ones keep being loaded from their URDF.
+        """
+        for urdf_key, urdf in self.entity_urdf_dict.items():
+            template_id = p.loadURDF(urdf, self.parking_position, physicsClientId=self.physicsClient)
+            mass, lateral_friction = p.getDynamicsInfo(template_id, -1, physicsClientId=self.physicsClient)[:2]
+            template = EntityTemplate(urdf, mass, lateral_friction)
 
-        rob_entity_id = self.object_entity_dict["robot"]
+            collision_data = p.getCollisionShapeData(template_id, -1, physicsClientId=self.physicsClient)
+            visual_data = p.getVisualShapeData(template_id, physicsClientId=self.physicsClient)
 
-        cmd_index = 0
-        if duration == 0:
-            while(True):
-                if cmd_index < len(commands):
-                    cmd, args = commands[cmd_index]
-                    self.execute_command(cmd, args)
-                cmd_index += 1
+            if p.getNumJoints(template_id, physicsClientId=self.physicsClient) == 0 and len(collision_data) == 1 and len(visual_data) == 1:
+                _, _, geom_type, dims, file_name, frame_pos, frame_orn = collision_data[0]
+                template.collision_shape = p.createCollisionShape(geom_type, **shape_geometry(geom_type, dims, file_name),
+                                                                  collisionFramePosition=frame_pos,
+                                                                  collisionFrameOrientation=frame_orn,
+                                                                  physicsClientId=self.physicsClient)
 
-                # mode = p.VELOCITY_CONTROL
-                # p.setJointMotorControlArray(rob_entity_id, jointIndices=[2, 3, 6, 7], controlMode=mode, targetVelocities=[10.0, 10.0, 10.0, 10.0])
+                _, _, geom_type, dims, file_name, frame_pos, frame_orn, rgba = visual_data[0]
+                template.visual_shape = p.createVisualShape(geom_type, **shape_geometry(geom_type, dims, file_name),
+                                                            visualFramePosition=frame_pos,
+                                                            visualFrameOrientation=frame_orn,
+                                                            rgbaColor=rgba,
+                                                            physicsClientId=self.physicsClient)
 
-                p.stepSimulation()
-                time.sleep(1./240.)
+            p.removeBody(template_id, physicsClientId=self.physicsClient)
+            self.entity_templates[urdf_key] = template
+            self.body_pool[urdf_key] = []
+
+    def spawn_entity(self, urdf_key: str, pos: List[float]) -> int:
+        template = self.entity_templates[urdf_key]
+        pool = self.body_pool[urdf_key]
+
+        if pool != []:
+            entity_id = pool.pop()
+            self.set_body_active(entity_id, True, template.mass)
+            self.teleport(entity_id, pos)
+        elif template.collision_shape is not None:
+            entity_id = p.createMultiBody(template.mass, template.collision_shape, template.visual_shape, pos, self.default_orientation,
+                                          physicsClientId=self.physicsClient)
+            p.changeDynamics(entity_id, -1, lateralFriction=template.lateral_friction, physicsClientId=self.physicsClient)
         else:
-            for _ in range(duration):
-                if cmd_index < len(commands):
-                    cmd, args = commands[cmd_index]
-                    self.execute_command(cmd, args)
-                cmd_index += 1
+            entity_id = p.loadURDF(template.urdf, pos, self.default_orientation, physicsClientId=self.physicsClient)
+
+        self.entity_ids.append(entity_id)
+        return entity_id
+
+    def despawn_entity(self, urdf_key: str, entity_id: int) -> None:
+        self.set_body_active(entity_id, False, 0.0)
+        self.teleport(entity_id, self.parking_position)
+        self.entity_ids.remove(entity_id)
+        self.body_pool[urdf_key].append(entity_id)
+
+    def set_body_active(self, entity_id: int, active: bool, mass: float) -> None:
+        # Parked bodies are static and collide with nothing
+        collision_mask = -1 if active else 0
+        for link in range(-1, p.getNumJoints(entity_id, physicsClientId=self.physicsClient)):
+            p.setCollisionFilterGroupMask(entity_id, link, collision_mask, collision_mask, physicsClientId=self.physicsClient)
+
+        p.changeDynamics(entity_id, -1, mass=mass, physicsClientId=self.physicsClient)
+
+    def teleport(self, entity_id: int, pos: List[float]) -> None:
+        p.resetBasePositionAndOrientation(entity_id, pos, self.default_orientation, physicsClientId=self.physicsClient)
+        p.resetBaseVelocity(entity_id, [0.0, 0.0, 0.0], [0.0, 0.0, 0.0], physicsClientId=self.physicsClient)
+
+    def run_simulation(self, commands: List[Tuple[str, List[str]]], duration: int = 0, disconnect: bool = True) -> bool:
+        start_step = self.start_execution()
+        success = True
+
+        for i, (cmd, args) in enumerate(commands):
+            if duration != 0 and self.sim_step - start_step >= duration:
+                break
+
+            success = self.dispatch_command(i, cmd, args, start_step) and success
+
+            if self.monitor and not success:
+                break
+
+        self.finish_execution(start_step, duration, disconnect)
+        return success
+
+    def start_execution(self) -> int:
+        snapshot = self.snapshot()
+        for obj, state in zip(snapshot.names, snapshot.states):
+            print(obj, tuple(state[0:3].tolist()), tuple(state[3:7].tolist()))
+
+        if self.realtime:
+            time.sleep(2.0)
+
+        self.execution_report = ExecutionReport(True, 0)
+        return self.sim_step
+
+    def dispatch_command(self, i: int, cmd: str, args: List[str], start_step: int) -> bool:
+        """
+            Execute the `i`th command of a run started at `start_step` and step the simulation after it. With the
+            monitor on, a failed command or a body off its expected position marks the run as diverged.
+        """
+        success = self.execute_command(cmd, args)
+        self.settle() if self.run_until_settled or self.monitor else self.step_simulation(self.steps_per_command)
+        self.execution_report.commands_executed = i + 1
+        self.execution_report.execution_time = (self.sim_step - start_step) * self.time_step
+
+        if self.monitor:
+            errors = self.position_errors()
+
+            if not success or errors != {}:
+                self.execution_report = ExecutionReport(False, i + 1, i, (cmd, args), errors,
+                                                        (self.sim_step - start_step) * self.time_step)
+                print(f"Execution diverged at step {i} {cmd} {args}: {errors}")
+                return False
+
+        return success
+
+    def finish_execution(self, start_step: int, duration: int = 0, disconnect: bool = True) -> None:
+        # The GUI stays up until it is closed when no duration is given, headless runs stop after the plan
+        while (duration == 0 and self.gui) or self.sim_step - start_step < duration:
+            self.step_simulation(1)
+
+        if disconnect:
+            p.disconnect(physicsClientId=self.physicsClient)
+
+    def step_simulation(self, steps: int) -> int:
+        for _ in range(steps):
+            p.stepSimulation(physicsClientId=self.physicsClient)
+            self.sim_step += 1
+
+            if self.snapshot_buffer is not None and self.sim_step % self.record_interval == 0:
+                self.snapshot_buffer.record(self.sim_step, self.read_states())
+
+            if self.realtime:
+                time.sleep(self.time_step)
+
+        return steps
 
-                p.stepSimulation()
-                time.sleep(1./240.)
+    def read_states(self) -> np.ndarray:
+        """
+            Base pose and velocity of every object in `self.objects` as one (n, 13) array, NaN for held objects.
+        """
+        states = np.full((len(self.objects), STATE_SIZE), np.nan)
 
-        p.disconnect()
+        for i, obj in enumerate(self.objects):
+            entity_id = self.object_entity_dict.get(obj)
+            if entity_id is None:
+                continue
 
-    def execute_command(self, command: str, args: List[str]):
+            pos, orn = p.getBasePositionAndOrientation(entity_id, physicsClientId=self.physicsClient)
+            lin_vel, ang_vel = p.getBaseVelocity(entity_id, physicsClientId=self.physicsClient)
+            states[i] = pos + orn + lin_vel + ang_vel
+
+        return states
+
+    def snapshot(self) -> Snapshot:
+        return Snapshot(self.sim_step, self.objects, self.read_states())
+
+    def position_errors(self) -> Dict[str, float]:
+        """
+            Distance of every object from its expected position, for the objects outside `position_tolerance`.
+            Objects that should be resting somewhere but are held, or vice versa, count as infinitely far off.
+        """
+        positions = self.snapshot().positions
+
+        distances = np.linalg.norm(positions - self.expected_positions, axis=1)
+        expected = ~np.isnan(self.expected_positions[:, 0])
+        present = ~np.isnan(positions[:, 0])
+        distances[expected != present] = np.inf
+
+        diverged = (expected != present) | (expected & present & (distances > self.position_tolerance))
+        return {self.objects[i]: float(distances[i]) for i in np.flatnonzero(diverged)}
+
+    def goal_errors(self, goal_predicates: List[Predicate]) -> Dict[str, float]:
+        """
+            Distance by which every unmet goal misses, keyed by the goal atom. at goals compare the object with the
+            goal position, planar only for robots as they stop `approach_offset` beside it. on goals need the upper
+            object right above the lower one. Held objects miss by an infinite distance.
+        """
+        snapshot = self.snapshot()
+        positions = {obj: snapshot.positions[i] for i, obj in enumerate(snapshot.names)}
+        errors = {}
+
+        for goal in goal_predicates:
+            names = [term.name for term in goal.terms]
+            actual = [positions.get(name, np.full(3, np.nan)) for name in names]
+
+            match goal.name:
+                case "at":
+                    target = np.array(self.positions[names[1]].pos, dtype=float)
+
+                    if names[0].split("_")[0] == "robot":
+                        target[0] += self.approach_offset
+                        distance = np.linalg.norm(actual[0][:2] - target[:2])
+                    else:
+                        distance = np.linalg.norm(actual[0] - target)
+
+                case "on":
+                    distance = np.linalg.norm(actual[0][:2] - actual[1][:2])
+                    if not actual[0][2] > actual[1][2]:
+                        distance = np.inf
+
+                case _:
+                    continue
+
+            if np.isnan(distance) or distance > self.position_tolerance:
+                errors[f"({goal.name} {' '.join(names)})"] = float(np.inf if np.isnan(distance) else distance)
+
+        return errors
+
+    def expect(self, obj: str, pos: Optional[List[float]]) -> None:
+        # Commands check their objects first, an unknown name here is a dispatcher bug
+        self.expected_positions[self.object_index[obj]] = np.nan if pos is None else pos
+
+    def is_settled(self) -> bool:
+        snapshot = self.snapshot()
+        velocities = snapshot.states[snapshot.present, 7:]
+
+        return bool(np.all(np.abs(velocities) <= self.settle_tolerance))
+
+    def settle(self) -> int:
+        """
+            Step until every tracked body is at rest or `max_settle_steps` is reached.
+        """
+        steps = self.step_simulation(1)
+
+        while steps < self.max_settle_steps and not self.is_settled():
+            steps += self.step_simulation(1)
+
+        return steps
+
+    def object_poses(self) -> Dict[str, Tuple[Tuple[float, ...], Tuple[float, ...]]]:
+        poses = {}
+
+        for obj, entity_id in self.object_entity_dict.items():
+            if entity_id in self.entity_ids:
+                poses[obj] = p.getBasePositionAndOrientation(entity_id, physicsClientId=self.physicsClient)
+
+        return poses
+
+    def execute_command(self, command: str, args: List[str]) -> bool:
         match command:
             case "move":
-                self.move_action(args)
-            case "grasp":
-                self.grasp_action(args)
-            case "place":
-                self.place_action(args)
-            case "unstack":
-                self.grasp_action(args)
-            case "stack":
-                self.place_action(args)
+                return self.move_action(args)
+            case "grasp" | "unstack":
+                return self.grasp_action(args)
+            case "place" | "stack":
+                return self.place_action(args)
             case _:
                 print(f"Unknown command: {command}")
+                return False
 
-    def move_action(self, args: List[str]):
+    def move_action(self, args: List[str]) -> bool:
         # print(f"Move action executed with args: {args}")
         entity_id = self.object_entity_dict[args[0]]
         target_pos = self.positions[args[2]].pos.copy()
-        target_pos[0] += 1.2
-        target_pos[2] = 0.4
+        target_pos[0] += self.approach_offset
 
-        p.removeBody(entity_id)
-        new_entity_id = p.loadURDF(self.entity_urdf_dict[args[0]], target_pos, self.default_orientation)
-        self.entity_ids.append(new_entity_id)
-        self.entity_ids.remove(entity_id)
-        self.object_entity_dict[args[0]] = new_entity_id
+        if not self.drive_robot:
+            target_pos[2] = 0.4
+            self.teleport(entity_id, target_pos)
+            self.expect(args[0], target_pos)
+            return True
+
+        path = self.robot_path(entity_id, target_pos)
+        if path is None:
+            print(f"No collision free path for {args[0]} from {args[1]} to {args[2]}")
+            return False
+
+        drive = self.robot_drive(entity_id)
+        result = drive.follow_path(path, self.step_simulation, self.time_step)
+        self.move_results.append(result)
+        print(f"Move {args[1]} -> {args[2]}: {result.duration:.2f}s over {result.distance:.2f}m, success: {result.success}")
+
+        target_pos[2] = p.getBasePositionAndOrientation(entity_id, physicsClientId=self.physicsClient)[0][2]
+        self.expect(args[0], target_pos)
+        return result.success
 
-    def grasp_action(self, args: List[str]):
+    def robot_drive(self, entity_id: int) -> DifferentialDrive:
+        if entity_id not in self.drives:
+            left = [j for j, name in self.robot_wheel_joints.items() if name.startswith("left")]
+            right = [j for j, name in self.robot_wheel_joints.items() if name.startswith("right")]
+            self.drives[entity_id] = DifferentialDrive(entity_id, self.physicsClient, left, right, self.drive_config)
+
+        return self.drives[entity_id]
+
+    def robot_path(self, entity_id: int, target_pos: List[float]) -> Optional[List[Waypoint]]:
+        """
+            Route around every block as it currently stands in the simulation, keeping the robot center
+            `path_clearance` away from each block column along both axes.
+        """
+        x, y, _ = p.getBasePositionAndOrientation(entity_id, physicsClientId=self.physicsClient)[0]
+        snapshot = self.snapshot()
+
+        columns = {(round(float(pos[0]), 2), round(float(pos[1]), 2))
+                   for obj, pos, present in zip(snapshot.names, snapshot.positions, snapshot.present)
+                   if present and obj.split("_")[0] == "block"}
+
+        return plan_path((x, y), (target_pos[0], target_pos[1]), sorted(columns), self.path_clearance)
+
+    def grasp_action(self, args: List[str]) -> bool:
         # print(f"Grasp action executed with args: {args}")
-        entity_id = self.object_entity_dict[args[1]]
-        p.removeBody(entity_id)
-        self.entity_ids.remove(entity_id)
+        if args[1] not in self.object_index or args[1] not in self.object_entity_dict:
+            print(f"Cannot grasp {args[1]}: unknown or already held")
+            return False
+
+        entity_id = self.object_entity_dict.pop(args[1])
+        self.despawn_entity(args[1].split("_")[0], entity_id)
+        self.held_objects[args[1]] = args[0]
+        self.expect(args[1], None)
+        return True
 
-    def place_action(self, args: List[str]):
+    def place_action(self, args: List[str]) -> bool:
         # print(f"Place action executed with args: {args}")
+        if self.held_objects.get(args[1]) != args[0]:
+            print(f"Cannot place {args[1]}: not held by {args[0]}")
+            return False
+
         pos = self.positions[args[2]].pos
         place_pos = pos
         # place_pos[0] += 1.2
@@ -119,6 +458,7 @@ class CommandDispatcher:
         print(args[2], place_pos)
 
         urdf_key = args[1].split("_")[0]
-        entity_id = p.loadURDF(self.entity_urdf_dict[urdf_key], place_pos, self.default_orientation)
-        self.entity_ids.append(entity_id)
-        self.object_entity_dict[args[1]] = entity_id
+        self.object_entity_dict[args[1]] = self.spawn_entity(urdf_key, place_pos)
+        del self.held_objects[args[1]]
+        self.expect(args[1], place_pos)
+        return True
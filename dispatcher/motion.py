@@ -0,0 +1,214 @@
+import math
+import time
+import heapq
+import numpy as np
+import pybullet as p
+
+from dataclasses import dataclass, field
+from typing import List, Tuple, Callable, Optional
+
+Waypoint = Tuple[float, float]
+
+@dataclass
+class DriveConfig:
+    max_wheel_velocity: float = 30.0
+    max_turn_velocity: float = 8.0
+    max_wheel_acceleration: float = 30.0
+    wheel_force: float = 100.0
+    turn_gain: float = 20.0
+    drive_gain: float = 20.0
+    heading_tolerance: float = 0.3
+    waypoint_tolerance: float = 0.3
+    goal_tolerance: float = 0.1
+    max_steps: int = 240 * 60
+    # Wheel commands are updated every `control_interval` physics steps
+    control_interval: int = 4
+
+@dataclass
+class MoveResult:
+    success: bool
+    steps: int
+    duration: float
+    distance: float
+    wall_time: float
+
+@dataclass
+class DifferentialDrive:
+    """
+        Skid-steer controller for r2d2. The robot drives along its base -y axis and turns by running
+        its left and right wheels in opposite directions.
+    """
+    robot_id: int
+    physics_client: int
+    left_wheels: List[int]
+    right_wheels: List[int]
+    config: DriveConfig = field(default_factory=lambda: DriveConfig())
+    wheel_velocities: Tuple[float, float] = (0.0, 0.0)
+
+    def pose(self) -> Tuple[float, float, float]:
+        pos, orn = p.getBasePositionAndOrientation(self.robot_id, physicsClientId=self.physics_client)
+        yaw = p.getEulerFromQuaternion(orn)[2]
+
+        return pos[0], pos[1], yaw - math.pi / 2
+
+    def set_wheels(self, left: float, right: float, dt: float = 0.0) -> None:
+        """
+            Command the wheel velocities, ramped by `max_wheel_acceleration` over `dt` seconds. A zero `dt`
+            applies them at once.
+        """
+        limit = self.config.max_wheel_velocity
+        left = max(-limit, min(limit, left))
+        right = max(-limit, min(limit, right))
+
+        if dt > 0.0:
+            max_change = self.config.max_wheel_acceleration * dt
+            last_left, last_right = self.wheel_velocities
+            left = last_left + max(-max_change, min(max_change, left - last_left))
+            right = last_right + max(-max_change, min(max_change, right - last_right))
+
+        self.wheel_velocities = (left, right)
+
+        joints = self.left_wheels + self.right_wheels
+        velocities = [left] * len(self.left_wheels) + [right] * len(self.right_wheels)
+
+        p.setJointMotorControlArray(self.robot_id, joints, p.VELOCITY_CONTROL,
+                                    targetVelocities=velocities,
+                                    forces=[self.config.wheel_force] * len(joints),
+                                    physicsClientId=self.physics_client)
+
+    def wheel_command(self, target: Waypoint) -> Tuple[float, float, float]:
+        x, y, heading = self.pose()
+        dx, dy = target[0] - x, target[1] - y
+        distance = math.hypot(dx, dy)
+
+        heading_error = math.atan2(dy, dx) - heading
+        heading_error = math.atan2(math.sin(heading_error), math.cos(heading_error))
+
+        # Turn on the spot first, then drive while correcting the heading. The turn rate is capped
+        # separately as r2d2 tips over when it pivots at full wheel speed
+        turn = max(-self.config.max_turn_velocity, min(self.config.max_turn_velocity, self.config.turn_gain * heading_error))
+        drive = 0.0
+        if abs(heading_error) < self.config.heading_tolerance:
+            drive = min(self.config.max_wheel_velocity, self.config.drive_gain * distance) * math.cos(heading_error)
+
+        return drive + turn, drive - turn, distance
+
+    def follow_path(self, waypoints: List[Waypoint], step: Callable[[int], int], time_step: float) -> MoveResult:
+        """
+            Drive through `waypoints` in order, calling `step` once per physics step. Intermediate waypoints
+            are passed within `waypoint_tolerance`, the last one has to be reached within `goal_tolerance`.
+        """
+        start = time.perf_counter()
+        x, y, _ = self.pose()
+        steps = 0
+        distance = 0.0
+
+        for i, waypoint in enumerate(waypoints):
+            tolerance = self.config.goal_tolerance if i == len(waypoints) - 1 else self.config.waypoint_tolerance
+
+            while True:
+                left, right, remaining = self.wheel_command(waypoint)
+                if remaining < tolerance:
+                    break
+
+                if steps >= self.config.max_steps:
+                    self.set_wheels(0.0, 0.0)
+                    return MoveResult(False, steps, steps * time_step, distance, time.perf_counter() - start)
+
+                self.set_wheels(left, right, self.config.control_interval * time_step)
+                steps += step(self.config.control_interval)
+
+                new_x, new_y, _ = self.pose()
+                distance += math.hypot(new_x - x, new_y - y)
+                x, y = new_x, new_y
+
+        self.set_wheels(0.0, 0.0)
+        return MoveResult(True, steps, steps * time_step, distance, time.perf_counter() - start)
+
+def occupancy_grid(obstacles: List[Waypoint],
+                   points: List[Waypoint],
+                   half_extent: float,
+                   resolution: float,
+                   margin: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+        Boolean grid over the obstacles and `points` plus `margin`, True where the robot center would come within
+        `half_extent` of an obstacle center along both axes. Returns the grid and the world position of cell (0, 0).
+    """
+    coords = np.array(obstacles + points, dtype=float).reshape(-1, 2)
+    origin = coords.min(axis=0) - margin
+    shape = np.ceil((coords.max(axis=0) + margin - origin) / resolution).astype(int) + 1
+
+    xs = origin[0] + np.arange(shape[0]) * resolution
+    ys = origin[1] + np.arange(shape[1]) * resolution
+    blocked = np.zeros(shape, dtype=bool)
+
+    for ox, oy in obstacles:
+        near_x = np.abs(xs - ox) < half_extent
+        near_y = np.abs(ys - oy) < half_extent
+        blocked |= near_x[:, None] & near_y[None, :]
+
+    return blocked, origin
+
+def line_of_sight(blocked: np.ndarray, a: Tuple[int, int], b: Tuple[int, int]) -> bool:
+    steps = max(abs(b[0] - a[0]), abs(b[1] - a[1]), 1)
+    cells = np.rint(np.linspace(a, b, 2 * steps + 1)).astype(int)
+    return not blocked[cells[:, 0], cells[:, 1]].any()
+
+def plan_path(start: Waypoint,
+              goal: Waypoint,
+              obstacles: List[Waypoint],
+              half_extent: float = 1.1,
+              resolution: float = 0.1,
+              margin: float = 3.0) -> Optional[List[Waypoint]]:
+    """
+        Shortest 8-connected grid path from `start` to `goal` that keeps the robot clear of the blocks centered at
+        `obstacles`, shortened to the waypoints where it has to turn. The start and goal cells are always free,
+        the robot may already stand next to a block and has to end next to one. None when the goal is walled in.
+    """
+    blocked, origin = occupancy_grid(obstacles, [start, goal], half_extent, resolution, margin)
+    to_cell = lambda point: tuple(np.rint((np.array(point) - origin) / resolution).astype(int).tolist())
+    start_cell, goal_cell = to_cell(start), to_cell(goal)
+    blocked[start_cell] = blocked[goal_cell] = False
+
+    moves = [(dx, dy, math.hypot(dx, dy)) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0)]
+    heuristic = lambda cell: math.hypot(cell[0] - goal_cell[0], cell[1] - goal_cell[1])
+
+    queue = [(heuristic(start_cell), 0.0, start_cell)]
+    parents = {start_cell: start_cell}
+    costs = {start_cell: 0.0}
+
+    while queue:
+        _, cost, cell = heapq.heappop(queue)
+
+        if cell == goal_cell:
+            break
+
+        if cost > costs[cell]:
+            continue
+
+        for dx, dy, step in moves:
+            succ = (cell[0] + dx, cell[1] + dy)
+
+            if not (0 <= succ[0] < blocked.shape[0] and 0 <= succ[1] < blocked.shape[1]) or blocked[succ]:
+                continue
+
+            if cost + step < costs.get(succ, math.inf):
+                costs[succ] = cost + step
+                parents[succ] = cell
+                heapq.heappush(queue, (cost + step + heuristic(succ), cost + step, succ))
+    else:
+        return None
+
+    cells = [goal_cell]
+    while cells[-1] != start_cell:
+        cells.append(parents[cells[-1]])
+    cells.reverse()
+
+    # Keep only the cells the robot has to turn at, every skipped stretch is a straight free line
+    turns = [cells[0]]
+    for i in range(1, len(cells) - 1):
+        if not line_of_sight(blocked, turns[-1], cells[i + 1]):
+            turns.append(cells[i])
+
+    waypoints = [(float(origin[0] + cx * resolution), float(origin[1] + cy * resolution)) for cx, cy in turns[1:]]
+    return waypoints + [goal]
@@ -0,0 +1,86 @@
+import numpy as np
+
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple
+
+# Per body: position (3), orientation quaternion (4), linear velocity (3), angular velocity (3)
+STATE_SIZE = 13
+
+@dataclass
+class Snapshot:
+    """
+        Base states of all tracked objects at one simulation step. Rows follow `names`, objects that are
+        currently held by the robot have NaN rows.
+    """
+    step: int
+    names: List[str]
+    states: np.ndarray
+    index: Dict[str, int] = field(default_factory=lambda: {})
+
+    def __post_init__(self):
+        if self.index == {}:
+            self.index = {name: i for i, name in enumerate(self.names)}
+
+    @property
+    def positions(self) -> np.ndarray:
+        return self.states[:, 0:3]
+
+    @property
+    def orientations(self) -> np.ndarray:
+        return self.states[:, 3:7]
+
+    @property
+    def linear_velocities(self) -> np.ndarray:
+        return self.states[:, 7:10]
+
+    @property
+    def angular_velocities(self) -> np.ndarray:
+        return self.states[:, 10:13]
+
+    @property
+    def present(self) -> np.ndarray:
+        return ~np.isnan(self.states[:, 0])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.states[self.index[name]]
+
+@dataclass
+class SnapshotBuffer:
+    """
+        Fixed size ring buffer of snapshots, preallocated so recording is a single array copy.
+    """
+    names: List[str]
+    capacity: int = 1024
+    interval: int = 1
+
+    steps: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    data: np.ndarray = field(default_factory=lambda: np.zeros((0, 0, STATE_SIZE)))
+    count: int = 0
+
+    def __post_init__(self):
+        self.steps = np.zeros(self.capacity, dtype=np.int64)
+        self.data = np.full((self.capacity, len(self.names), STATE_SIZE), np.nan)
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def record(self, step: int, states: np.ndarray) -> None:
+        slot = self.count % self.capacity
+        self.steps[slot] = step
+        self.data[slot] = states
+        self.count += 1
+
+    def history(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Recorded steps and states, oldest first.
+        """
+        if self.count <= self.capacity:
+            return self.steps[:self.count].copy(), self.data[:self.count].copy()
+
+        order = np.roll(np.arange(self.capacity), -(self.count % self.capacity))
+        return self.steps[order], self.data[order]
+
+    def snapshots(self) -> List[Snapshot]:
+        steps, data = self.history()
+        index = {name: i for i, name in enumerate(self.names)}
+        return [Snapshot(int(step), self.names, states, index) for step, states in zip(steps, data)]
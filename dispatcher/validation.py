@@ -0,0 +1,64 @@
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Optional, Any, Union
+
+from pddl.logic import Predicate
+from pddl_parser.pddl_parser import PositionObject
+from dispatcher.dispatcher import CommandDispatcher
+
+import pybullet as p
+
+Plan = List[Tuple[str, List[str]]]
+# Initial predicates, positions, plan and optionally the goal predicates
+ValidationJob = Union[Tuple[List[Predicate], Dict[str, PositionObject], Plan],
+                      Tuple[List[Predicate], Dict[str, PositionObject], Plan, List[Predicate]]]
+
+@dataclass
+class ValidationResult:
+    success: bool
+    final_poses: Dict[str, Tuple[Tuple[float, ...], Tuple[float, ...]]] = field(default_factory=lambda: {})
+    error: Optional[str] = None
+    divergent_step: Optional[int] = None
+    goal_errors: Dict[str, float] = field(default_factory=lambda: {})
+
+def validate_plan(job: ValidationJob, dispatcher_kwargs: Optional[Dict[str, Any]] = None) -> ValidationResult:
+    """
+        Execute one plan in a fresh DIRECT physics client owned by the calling process. The execution
+        monitor is on by default, so a plan stops at its first step that does not reach its effect.
+        With goal predicates in the job, a plan that executes but leaves a goal unmet in the final state
+        fails as well.
+    """
+    init_predicates, positions, plan = job[:3]
+    goal_predicates = job[3] if len(job) > 3 else None
+    kwargs = {"gui": False, "realtime": False, "monitor": True}
+    kwargs.update(dispatcher_kwargs or {})
+
+    cd = CommandDispatcher(init_predicates, positions, **kwargs)
+
+    try:
+        cd.initialize_objects()
+        success = cd.run_simulation(plan, disconnect=False)
+        report = cd.execution_report
+        goal_errors = cd.goal_errors(goal_predicates) if success and goal_predicates is not None else {}
+
+        return ValidationResult(success and goal_errors == {}, cd.object_poses(),
+                                divergent_step=None if report is None else report.divergent_step,
+                                goal_errors=goal_errors)
+
+    except Exception as e:
+        return ValidationResult(False, error=f"{type(e).__name__}: {e}\n{traceback.format_exc()}")
+
+    finally:
+        p.disconnect(physicsClientId=cd.physicsClient)
+
+def validate_plans(jobs: List[ValidationJob],
+                   max_workers: Optional[int] = None,
+                   dispatcher_kwargs: Optional[Dict[str, Any]] = None) -> List[ValidationResult]:
+    """
+        Validate many plans concurrently, one physics client per worker process. Results keep the job order.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(validate_plan, job, dispatcher_kwargs) for job in jobs]
+        return [future.result() for future in futures]
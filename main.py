@@ -1,49 +1,108 @@
-from pddl_parser.pddl_parser import PddlProblemParser, parse_plan
+from pddl_parser.pddl_parser import PddlProblemParser
 from dispatcher.dispatcher import CommandDispatcher
-from pathlib import Path
+from planners.planners import write_plan
+from planners.portfolio import Plan, solve_portfolio
+from planners.solver import PlanStream, load_domain, domain_path, solve_problem
+from planners.plan_cache import PlanCache
+from planners.translation_cache import TranslationCache
+from dispatcher.anytime import run_anytime
+from typing import Tuple, Optional
 
-from os.path import exists
-from os import listdir
 from os import makedirs
 
-import subprocess
+def solve_pddl_problem(domain_name: str,
+                       problem_name: str,
+                       solver: str = "downward",
+                       plan_dir: str = "plans/",
+                       action_costs: bool = False,
+                       cache: Optional[PlanCache] = None,
+                       translation_cache: Optional[TranslationCache] = None,
+                       time_limit: Optional[float] = None,
+                       problem_dir: str = "pddl_worlds/blocks/") -> Optional[str]:
+    """
+        Solve <problem_dir><problem_name>.pddl into <plan_dir><problem_name>/plan_<solver>.1, where
+        Fast Downward's plans are named plan_lama.1. With a `cache`, plans of equivalent problems are written
+        as plan_cached.1 instead of running the planner. With a `translation_cache`, Fast Downward searches a
+        cached translation of the problem. Planners are stopped after `time_limit` seconds. Returns the plan
+        file written by this call, None when no plan was found.
+    """
+    domain = domain_path(domain_name)
+    problem = f"{problem_dir}{problem_name}.pddl"
+    plans_dir = f"{plan_dir}{problem_name}/"
 
-def solve_pddl_problem(domain_name: str, problem_name: str, solver: str = "downward", plan_dir: str = "plans/"):
-    domain = f"pddl_worlds/blocks/{domain_name}_domain.pddl"
-    problem = f"pddl_worlds/blocks/{problem_name}.pddl"
+    # Only Fast Downward reads the action cost domain, the native planners read the costs from the problem
+    domain_text = load_domain(domain_name, action_costs and solver == "downward")
 
-    home = Path.home()
-    cmd = f"{home}/downward/fast-downward.py --plan-file {plan_dir}{problem_name}/plan_lama --alias seq-sat-lama-2011 {domain} {problem}"
+    with open(problem, 'r') as f:
+        problem_text = f.read()
+
+    found: Optional[Tuple[Plan, int]] = None
+    cached = False
 
     match solver:
-        case "downward":
-            subprocess.run(cmd.split())
+        case "downward" | "gbfs" | "wastar":
+            result = solve_problem(domain_text, problem_text, solver=solver, time_limit=time_limit,
+                                   cache=cache, translation_cache=translation_cache)
+            cached = result.cached
+
+            if result.best is not None:
+                found = (result.best.plan, result.best.cost)
+            elif result.status == "timeout":
+                print(f"{solver} time limit reached for {problem_name}")
+
+        case "portfolio":
+            found = None if cache is None else cache.lookup(domain_text, problem_text)
+            cached = found is not None
+
+            if not cached:
+                # The native configurations and plan validation keep the unit domain, Fast Downward gets the costs
+                cost_domain = domain_path(domain_name, action_costs)
+                sas_file = None if translation_cache is None else translation_cache.sas_file(cost_domain, problem)
+                portfolio_limit = 60.0 if time_limit is None else time_limit
+                result = solve_portfolio(domain, problem, time_limit=portfolio_limit, sas_file=sas_file,
+                                         cost_domain_file=cost_domain if action_costs else None)
+
+                if result is not None:
+                    print(f"Portfolio plan from {result.config.name}: cost {result.cost} after {result.time:.2f}s")
+                    found = (result.plan, result.cost)
+
+                    if cache is not None:
+                        cache.store(domain_text, problem_text, result.plan, result.cost, solver)
 
         case _:
             print(f"Undefined solver {solver}")
             raise NotImplementedError()
 
-def main():
-    problem_name = "blocks_problem_3"
+    if found is None:
+        print(f"No plan found by {solver} for {problem_name}")
+        return None
 
-    pp = PddlProblemParser("many_stacked", "blocks")
-    pp.define_problem(problem_name=problem_name, save=True)
+    plan_name = "cached" if cached else "lama" if solver == "downward" else solver
+    plan_file = f"{plans_dir}plan_{plan_name}.1"
+    makedirs(plans_dir, exist_ok=True)
+    write_plan(found[0], plan_file, found[1] if action_costs else None)
 
-    solve_pddl_problem("blocks", problem_name)
+    return plan_file
 
-    plans_dir = f"./plans/{problem_name}/"
+def main():
+    problem_name = "blocks_problem_3"
+    solver = "downward"
 
-    if not exists(plans_dir):
-        makedirs(plans_dir)
+    pp = PddlProblemParser("many_stacked", "blocks")
+    problem = pp.define_problem(problem_name=problem_name)
 
-    plan_files = listdir(plans_dir)
-    plan_file_nums = [int(f[-1]) for f in plan_files]
-    plan_file = plan_files[plan_file_nums.index(max(plan_file_nums))]
-    plan = parse_plan(plans_dir + plan_file)
+    # The planner searches while the simulation loads, its first plan is dispatched as soon as it is written
+    stream = PlanStream(load_domain("blocks"), problem, solver=solver)
+    stream.start()
 
     cd = CommandDispatcher(pp.init_predicates, pp.positions)
     cd.initialize_objects()
-    cd.run_simulation(plan)
+
+    report = run_anytime(cd, stream)
+
+    if report.first_plan_latency is not None:
+        print(f"First plan after {report.first_plan_latency:.2f}s, executed {report.commands_executed} commands "
+              f"of plan {report.final_plan_index} with {len(report.switches)} switches")
     # cd.run_simulation([("", [" ", " "])])
 
 if __name__ == "__main__":
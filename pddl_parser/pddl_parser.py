@@ -2,40 +2,58 @@ import copy
 import numpy as np
 
 from pddl.logic import Predicate, Constant
-from pddl.core import Problem, Formula
-from pddl.formatter import problem_to_string
 from pddl import parse_domain
 
 from yaml import safe_load
-from typing import Dict, List, Union, Tuple
+from typing import Dict, List, Union, Tuple, Optional
 from dataclasses import replace
 
-from scipy.spatial import KDTree
+from scipy.spatial.distance import cdist
 from pddl_parser.predicate_definitions import *
+from pddl_parser.spatial_index import SpatialIndex, CoordinateIndex, index_from_points, coordinate_index_from_points
+from pddl_parser.problem_writer import ProblemDefinition, format_atom, group_constants, distance_atoms
 
 problem_config_path = "config/problem_configs/"
 
 class PddlProblemParser:
     def __init__(self, config_name: str,
                        domain_name: str,
-                       problem_config_path: str = "config/problem_configs/") -> None:
+                       problem_config_path: str = "config/problem_configs/",
+                       action_costs: bool = False,
+                       cost_scale: int = 10,
+                       init_config: Optional[Dict] = None,
+                       goal_config: Optional[Dict] = None) -> None:
         
         self.init_path = f"{problem_config_path}{config_name}/init.yaml"
         self.goal_path = f"{problem_config_path}{config_name}/goal.yaml"
         self.domain_name = domain_name
 
-        with open(self.init_path, 'r') as f:
-            self.init_config = safe_load(f)
-            f.close()
+        # With action costs, moves cost the planar travel distance in 1/cost_scale units
+        self.action_costs = action_costs
+        self.cost_scale = cost_scale
 
-        with open(self.goal_path, 'r') as f:
-            self.goal_config = safe_load(f)
-            f.close()
+        # Configs given in memory, e.g. from the scenario generator, skip the YAML files
+        self.init_config = init_config
+        self.goal_config = goal_config
+
+        if self.init_config is None:
+            with open(self.init_path, 'r') as f:
+                self.init_config = safe_load(f)
+                f.close()
+
+        if self.goal_config is None:
+            with open(self.goal_path, 'r') as f:
+                self.goal_config = safe_load(f)
+                f.close()
 
         self.things = []
         self.objects = {}
         self.positions = {}
 
+        # Shared by every stack and position query of this problem and updated as positions are added
+        self.spatial_index = SpatialIndex()
+        self.coordinate_index = CoordinateIndex()
+
         self.init_predicates = []
         self.goal_predicates = []
         self.predicates = parse_predicates_from_domain(domain_name)
@@ -44,20 +62,25 @@ class PddlProblemParser:
 
     def define_init_objects(self, init_config: dict) -> Tuple[Dict[str, Object], Dict[str, PositionObject]]:
         for obj_name, info in init_config.items():
-            obj = Constant(obj_name, type_tag=info["type"])
-
             pos_name = "p" + str(len(self.positions)+1)
             pos = Constant(pos_name, type_tag="location")
-
-            self.things.append(obj)
             self.things.append(pos)
 
             pos_class = PositionObject(name=pos_name, pos=info["position"], constant=pos)
-            obj_class = Object(name=obj_name, type_tag=info["type"], constant=obj, pos=pos_class, predicates=[])
-
-            pos_class.occupied_by = obj_class
 
             self.positions[pos_name] = pos_class
+            self.spatial_index.insert(pos_name, pos_class.pos)
+            self.coordinate_index.add(pos_name, pos_class.pos)
+
+            # Entries of type location, e.g. buffer spots from the scenario generator, start out free
+            if info["type"] == "location":
+                continue
+
+            obj = Constant(obj_name, type_tag=info["type"])
+            self.things.append(obj)
+
+            obj_class = Object(name=obj_name, type_tag=info["type"], constant=obj, pos=pos_class, predicates=[])
+            pos_class.occupied_by = obj_class
             self.objects[obj_name] = obj_class
 
         return self.objects, self.positions
@@ -70,7 +93,7 @@ class PddlProblemParser:
             obj = replace(self.objects[obj_name])
 
             pos = content['position']
-            pos_name = find_pos_id_from_value(self.positions, pos)
+            pos_name = find_pos_id_from_value(self.positions, pos, index=self.coordinate_index)
 
             # If position is already in the dictionary, just grab it
             # Otherwise, make a new Constant and PositionObject
@@ -83,6 +106,8 @@ class PddlProblemParser:
                                          pos=pos,
                                          constant=pos_constant)
                 self.positions[pos_name] = replace(pos_obj)
+                self.spatial_index.insert(pos_name, pos)
+                self.coordinate_index.add(pos_name, pos)
 
                 # Only new positions have to be added to the 'thing' list
                 # New positions should always be free at the beginning
@@ -106,7 +131,7 @@ class PddlProblemParser:
                                      predicates: Dict[str, Predicate]) -> List[Predicate]:
         predicates_names = list(predicates.keys())
 
-        stacks = find_stacks(self.positions)
+        stacks = find_stacks(self.positions, index=self.spatial_index)
 
         for predicate_name in predicates_names:
             match predicate_name:
@@ -158,39 +183,49 @@ class PddlProblemParser:
 
         return self.init_predicates
 
-    def define_goal_conditions(self, goal_objs: List[Object], positions: Dict[str, PositionObject]) -> Tuple[List[Constant], Union[Predicate, Formula]]:
-        stacks = find_stacks(positions)
+    def define_goal_predicates(self, goal_objs: List[Object], positions: Dict[str, PositionObject]) -> List[Predicate]:
+        stacks = find_stacks(positions, index=self.spatial_index)
 
         goal_at_predicates = define_at_predicates(self.predicates["at"], goal_objs)
         goal_on_predicates = define_on_predicates(self.predicates["on"], stacks, positions)
 
-        goals = goal_at_predicates + goal_on_predicates
-        goal_conds = goals[0]
+        self.goal_predicates = goal_at_predicates + goal_on_predicates
+        return self.goal_predicates
 
-        for g in goals[1:]:
-            goal_conds = goal_conds & g
+    def distance_costs(self, positions: Dict[str, PositionObject]) -> Tuple[List[str], np.ndarray]:
+        """
+            Integer move costs between every ordered pair of positions. The robot drives in the plane, so the cost
+            is the planar distance, scaled and rounded because Fast Downward only accepts integer costs.
+        """
+        pos_objs = list(positions.values())
+        planar_positions = np.array([p.pos for p in pos_objs])[:, :2]
+        costs = np.rint(cdist(planar_positions, planar_positions) * self.cost_scale).astype(int)
 
-        return self.things, goal_conds
+        return [p.name for p in pos_objs], costs
 
-    def define_problem(self, problem_name: str, save: bool = False):
+    def define_problem(self, problem_name: str, save: bool = False) -> ProblemDefinition:
         objects, positions = self.define_init_objects(self.init_config)
         goal_objs_list, goal_pos_dict, positions = self.define_goal_objects(self.goal_config)
 
         init_predicates = self.define_init_predicates(objects, positions, self.predicates)
-        objects, goal_conds = self.define_goal_conditions(goal_objs_list, goal_pos_dict)
+        goal_predicates = self.define_goal_predicates(goal_objs_list, goal_pos_dict)
+
+        problem = ProblemDefinition(name=problem_name,
+                                    domain_name=self.domain_name,
+                                    objects=group_constants(self.things),
+                                    init=[format_atom(p) for p in init_predicates],
+                                    goal=[format_atom(g) for g in goal_predicates])
 
-        problem = Problem(name=problem_name,
-                          domain_name=self.domain_name,
-                          objects=objects,
-                          init=init_predicates,
-                          goal=goal_conds)
+        if self.action_costs:
+            problem.requirements = [":action-costs"]
+            problem.metric = "minimize (total-cost)"
+            problem.init += ["(= (total-cost) 0)"] + distance_atoms(*self.distance_costs(positions))
 
-        print(f"Problem defined successfully: {problem}")
+        print(f"Problem {problem_name} defined successfully: {len(self.things)} objects, "
+              f"{len(problem.init)} init atoms, {len(problem.goal)} goals")
 
         if save:
-            with open(f"pddl_worlds/{self.domain_name}/{problem_name}.pddl", "w") as f:
-                f.write(problem_to_string(problem))
-                f.close()
+            problem.save(f"pddl_worlds/{self.domain_name}/{problem_name}.pddl")
 
         return problem
 
@@ -224,50 +259,22 @@ def parse_plan(plan_file: str) -> List[Tuple[str, List[str]]]:
 
     return cmd_book
 
-def find_pos_id_from_value(positions: Dict[str, PositionObject], pos: List[float]) -> Union[str, None]:
-    pos_names = positions.keys()
-    pos_coords = [p.pos for p in positions.values()]
-
-    if pos not in pos_coords:
-        return None
-
-    pos_indx = pos_coords.index(pos)
-    pos_id = list(pos_names)[pos_indx]
-
-    return pos_id
-
-def find_stacks(positions: Dict[str, PositionObject], threshold: float = 0.5) -> List[List[str]]:
-    stacks = []
-    visited_ids = []
-
-    # Make KDTree for the positions
-    pos_objs = positions.values()
-    pos_names = positions.keys()
-
-    pos_coords = [p.pos for p in pos_objs]
-    planar_positions = np.array(pos_coords)[:, :2]
-    block_tree = KDTree(planar_positions)
-
-    # One of the positions is for the robot, which cannot be part of any block stack
-    i = 0
-    while len(visited_ids) < (len(pos_names)):
-        if i in visited_ids:
-            i += 1
-            continue
-
-        pos_coord = pos_coords[i]
-
-        stack_inds = block_tree.query_ball_point(pos_coord[:2], threshold)
-
-        if stack_inds == []:
-            stacks.append([list(pos_names)[i]])
-            i += 1
-            continue
-
-        pos_in_stack = np.array(list(pos_names))[stack_inds]
-        stacks.append(pos_in_stack.tolist())
-        visited_ids.extend(list(stack_inds))
-
-        i += 1
-
-    return stacks
\ No newline at end of file
+def find_pos_id_from_value(positions: Dict[str, PositionObject],
+                           pos: List[float],
+                           index: Optional[CoordinateIndex] = None) -> Union[str, None]:
+    if index is None:
+        index = coordinate_index_from_points({name: p.pos for name, p in positions.items()})
+
+    return index.find(pos)
+
+def find_stacks(positions: Dict[str, PositionObject],
+                threshold: float = 0.5,
+                index: Optional[SpatialIndex] = None) -> List[List[str]]:
+    """
+        Group positions into stacks ordered bottom to top. The problem's spatial index is reused when given,
+        otherwise one is built over `positions`.
+    """
+    if index is None:
+        index = index_from_points({name: p.pos for name, p in positions.items()}, threshold)
+
+    return [stack for stack in index.all_stacks() if stack[0] in positions]
@@ -40,7 +40,7 @@ def define_at_top_predicates(at_top_predicate: Predicate,
             continue
 
         top_pos_id = np.argmax([p.pos[2] for p in occupied_positions])
-        top_pos = pos_objs[top_pos_id]
+        top_pos = occupied_positions[top_pos_id]
         top_obj = top_pos.occupied_by
 
         if top_obj.name == "robot": # type: ignore
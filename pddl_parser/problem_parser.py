@@ -1,19 +1,24 @@
-import numpy as np
-
 from yaml import safe_load
 from typing import Dict, List, Tuple, Optional
 
-from scipy.spatial import KDTree
+from pddl_parser.spatial_index import CoordinateIndex, index_from_points, coordinate_index_from_points
 from pypddl.block_domain import at, gripper_empty, at_top, holding, clear, pose_supported, At
 from pypddl.block_domain import Object, Pose, Block, Robot
 from pypddl.core import States, State
 
-def parse_config_to_states(config_name: str, problem_config_path: str = "config/problem_configs/") -> States:
+def parse_config_to_states(config_name: str,
+                           problem_config_path: str = "config/problem_configs/",
+                           init_config: Optional[Dict] = None,
+                           goal_config: Optional[Dict] = None) -> States:
     states = States({}, {}, State({}), [], State({}))
 
-    init_config, goal_config = load_configs_to_dicts(config_name, problem_config_path)
-    define_init_objects_and_poses(states, init_config)
-    define_goal_objects_and_poses(states, goal_config)
+    if init_config is None or goal_config is None:
+        init_config, goal_config = load_configs_to_dicts(config_name, problem_config_path)
+
+    # Resolves goal positions to the poses defined so far
+    pose_index = CoordinateIndex()
+    define_init_objects_and_poses(states, init_config, pose_index)
+    define_goal_objects_and_poses(states, goal_config, pose_index)
 
     build_physical_relations(states)
     define_init_predicates(states)
@@ -34,7 +39,7 @@ def load_configs_to_dicts(config_name: str, problem_config_path: str) -> Tuple[D
 
     return init_config, goal_config
 
-def define_init_objects_and_poses(states: States, init_config: Dict):
+def define_init_objects_and_poses(states: States, init_config: Dict, pose_index: Optional[CoordinateIndex] = None):
     idx = 1
     for obj_name, info in init_config.items():
         obj_type = obj_name.split('_')[0]
@@ -42,29 +47,40 @@ def define_init_objects_and_poses(states: States, init_config: Dict):
         pose_name = "p" + str(idx)
         pose = Pose(pose_name, info["position"])
 
+        states.poses[pose_name] = pose
+        idx += 1
+
+        if pose_index is not None:
+            pose_index.add(pose_name, pose.position)
+
+        # Free locations only add a pose
+        if info["type"] == "location":
+            continue
+
         if obj_type == "block":
             obj = Block(obj_name, pose)
         else:
             obj = Robot(obj_name, pose)
 
         states.objects[obj_name] = obj
-        states.poses[pose_name] = pose
-
         at(obj, pose)
-        idx += 1
 
     states.init_states['at'] = at.evaluated_predicates
 
-def define_goal_objects_and_poses(states: States, goal_config: Dict):
+def define_goal_objects_and_poses(states: States, goal_config: Dict, pose_index: Optional[CoordinateIndex] = None):
+    if pose_index is None:
+        pose_index = coordinate_index_from_points({name: pose.position for name, pose in states.poses.items()})
+
     goal_at = At()
     for obj_name, info in goal_config.items():
         pos = info['position']
-        pose_name = find_pose_from_value(states.poses, pos)
+        pose_name = find_pose_from_value(states.poses, pos, pose_index)
 
         if pose_name is None:
             pose_name = "p" + str(len(states.poses)+1)
             pose = Pose(pose_name, pos)
             states.poses[pose_name] = pose
+            pose_index.add(pose_name, pos)
         else:
             pose = states.poses[pose_name]
 
@@ -73,59 +89,40 @@ def define_goal_objects_and_poses(states: States, goal_config: Dict):
 
     states.goal_states['at'] = goal_at.evaluated_predicates
 
-def find_pose_from_value(poses: Dict[str, Pose], pos: List[float]) -> Optional[str]:
-    pose_names = poses.keys()
-    pose_coords = [p.position for p in poses.values()]
-
-    if pos not in pose_coords:
-        return None
-
-    pose_idx = pose_coords.index(pos)
-    pos_name = list(pose_names)[pose_idx]
+def find_pose_from_value(poses: Dict[str, Pose], pos: List[float], index: Optional[CoordinateIndex] = None) -> Optional[str]:
+    if index is None:
+        index = coordinate_index_from_points({name: pose.position for name, pose in poses.items()})
 
-    return pos_name
+    return index.find(pos)
 
 def build_physical_relations(states: States):
     """
         Go through the objects and determine their relations with each other.
     """
-    visited_obj_ids= []
-    stacks = []
-
-    objs = list(states.objects.values())
-    obj_positions = [obj.pose.position[:2] for obj in objs]
-
-    obj_tree = KDTree(obj_positions)
-    for i, pos in enumerate(obj_positions):
-        if i in visited_obj_ids:
-            continue
+    index = index_from_points({name: obj.pose.position for name, obj in states.objects.items()})
 
-        obj_idx_in_stack = obj_tree.query_ball_point(pos, 0.5)
-        visited_obj_ids.extend(obj_idx_in_stack)
-
-        objs_in_stack = np.array(objs)[obj_idx_in_stack]
-        objs_in_stack = sorted(objs_in_stack, key=lambda obj: (obj.pose.position[-1]))
+    for stack in index.all_stacks():
+        objs_in_stack = [states.objects[name] for name in stack]
 
         for j, obj in enumerate(objs_in_stack):
             if j > 0:
                 obj.on_top_of = objs_in_stack[j-1]
 
-            if j < len(obj_idx_in_stack)-1:
+            if j < len(objs_in_stack)-1:
                 obj.below = objs_in_stack[j+1]
 
-        stacks.append([obj.name for obj in objs_in_stack])
-
 def define_init_predicates(states: States):
-    for obj, pose in zip(states.objects.values(), states.poses.values()):
+    for obj in states.objects.values():
         if type(obj) is Block:
             at_top(obj)
 
-        clear(pose)
-
-    for pose in list(states.poses.values())[len(states.objects):]:
+    for pose in states.poses.values():
         clear(pose)
 
     states.init_states['at_top'] = at_top.evaluated_predicates
     states.init_states['clear'] = clear.evaluated_predicates
     gripper_empty(states.get_obj_of_type('robot', Robot))
-    states.init_states['gripper_empty'] = gripper_empty.evaluated_predicates
\ No newline at end of file
+    states.init_states['gripper_empty'] = gripper_empty.evaluated_predicates
+
+    for predicate in [at, gripper_empty, at_top, holding, clear, pose_supported]:
+        states.predicates[predicate.name] = predicate
\ No newline at end of file
@@ -0,0 +1,87 @@
+import numpy as np
+
+from io import StringIO
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Iterable, TextIO
+
+from pddl.logic import Constant, Predicate
+
+def format_atom(predicate: Predicate) -> str:
+    if predicate.arity == 0:
+        return f"({predicate.name})"
+
+    return f"({predicate.name} {' '.join(term.name for term in predicate.terms)})"
+
+def group_constants(constants: Iterable[Constant]) -> Dict[str, List[str]]:
+    objects: Dict[str, List[str]] = {}
+
+    for constant in constants:
+        objects.setdefault(constant.type_tag, []).append(constant.name)
+
+    return objects
+
+def distance_atoms(names: List[str], costs: np.ndarray) -> List[str]:
+    return [f"(= (distance {from_name} {to_name}) {cost})"
+            for from_name, row in zip(names, costs.tolist())
+            for to_name, cost in zip(names, row)]
+
+def write_joined(out: TextIO, items: List[str], chunk_size: int = 4096) -> None:
+    for start in range(0, len(items), chunk_size):
+        if start > 0:
+            out.write(" ")
+
+        out.write(" ".join(items[start:start+chunk_size]))
+
+@dataclass
+class ProblemDefinition:
+    """
+        A PDDL problem kept as text: objects by type tag, init and goal atoms as strings. It is written in the
+        layout of the pddl library formatter, but streamed straight to the output and with a flat goal.
+    """
+    name: str
+    domain_name: str
+    objects: Dict[str, List[str]]
+    init: List[str]
+    goal: List[str]
+    requirements: List[str] = field(default_factory=lambda: [])
+    metric: Optional[str] = None
+
+    def goal_string(self) -> str:
+        # Duplicate goals are dropped in order, as the pddl library does for conjunctions
+        goal = list(dict.fromkeys(self.goal))
+
+        if len(goal) == 1:
+            return goal[0]
+
+        return f"(and {' '.join(goal)})"
+
+    def write(self, out: TextIO) -> None:
+        out.write(f"(define (problem {self.name})\n")
+        out.write(f"    (:domain {self.domain_name})\n")
+
+        if self.requirements != []:
+            out.write(f"    (:requirements {' '.join(sorted(set(self.requirements)))})\n")
+
+        if self.objects != {}:
+            typed_objects = [f"{' '.join(sorted(set(names)))} - {type_tag}" for type_tag, names in sorted(self.objects.items())]
+            out.write(f"    (:objects {' '.join(typed_objects)})\n")
+
+        out.write("    (:init ")
+        write_joined(out, sorted(set(self.init)))
+        out.write(")\n")
+
+        out.write(f"    (:goal {self.goal_string()})\n")
+
+        if self.metric is not None:
+            out.write(f"    (:metric {self.metric})\n")
+
+        out.write(")")
+
+    def save(self, file_name: str) -> None:
+        with open(file_name, "w") as f:
+            self.write(f)
+
+    def __str__(self) -> str:
+        buffer = StringIO()
+        self.write(buffer)
+        return buffer.getvalue()
@@ -0,0 +1,200 @@
+import math
+import random
+import argparse
+
+from dataclasses import dataclass
+from os import makedirs
+from typing import Dict, List, Tuple, Optional
+
+from yaml import safe_dump
+
+from pddl_parser.pddl_parser import PddlProblemParser
+from planners.solver import load_domain, solve_problem
+
+Config = Dict[str, Dict]
+
+@dataclass
+class ScenarioSpec:
+    """
+        Parameters of a generated blocks scenario. Blocks are spread over `num_stacks` towers whose heights
+        are either given explicitly or drawn up to `max_height`. The first `num_static` blocks are static
+        and stay in place, the dynamic ones are shuffled into `num_goal_stacks` towers at new locations.
+        `num_buffers` free ground locations, by default one per goal tower plus the highest init tower, give
+        the planner room to take towers apart.
+    """
+    num_blocks: int
+    num_stacks: int
+    max_height: Optional[int] = None
+    heights: Optional[List[int]] = None
+    num_goal_stacks: Optional[int] = None
+    goal_max_height: Optional[int] = None
+    num_static: int = 0
+    num_buffers: Optional[int] = None
+    spacing: float = 5.0
+    block_size: float = 1.0
+    seed: int = 0
+
+def split_into_heights(rng: random.Random, num_blocks: int, num_stacks: int, max_height: Optional[int]) -> List[int]:
+    """
+        Random tower heights with every tower holding at least one block and at most `max_height`.
+    """
+    if num_stacks > num_blocks:
+        raise ValueError(f"Cannot build {num_stacks} stacks from {num_blocks} blocks")
+
+    max_height = num_blocks if max_height is None else max_height
+    if num_stacks * max_height < num_blocks:
+        raise ValueError(f"{num_blocks} blocks do not fit in {num_stacks} stacks of height {max_height}")
+
+    heights = [1] * num_stacks
+    open_stacks = [i for i in range(num_stacks) if heights[i] < max_height]
+
+    for _ in range(num_blocks - num_stacks):
+        i = rng.randrange(len(open_stacks))
+        heights[open_stacks[i]] += 1
+
+        if heights[open_stacks[i]] == max_height:
+            open_stacks[i] = open_stacks[-1]
+            open_stacks.pop()
+
+    return heights
+
+def grid_location(i: int, columns: int, spacing: float) -> Tuple[float, float]:
+    return (i % columns) * spacing, (i // columns) * spacing
+
+def tower_positions(base: Tuple[float, float], height: int, block_size: float) -> List[List[float]]:
+    return [[base[0], base[1], block_size * (0.5 + level)] for level in range(height)]
+
+def generate_scenario(spec: ScenarioSpec) -> Tuple[Config, Config]:
+    """
+        Build init and goal configs in the format of config/problem_configs/*/{init,goal}.yaml. The same
+        spec and seed always give the same scenario.
+    """
+    rng = random.Random(spec.seed)
+
+    heights = spec.heights if spec.heights is not None else \
+              split_into_heights(rng, spec.num_blocks, spec.num_stacks, spec.max_height)
+
+    if sum(heights) != spec.num_blocks or len(heights) != spec.num_stacks:
+        raise ValueError(f"Heights {heights} do not match {spec.num_blocks} blocks in {spec.num_stacks} stacks")
+
+    num_goal_stacks = spec.num_goal_stacks or spec.num_stacks
+    num_buffers = spec.num_buffers if spec.num_buffers is not None else num_goal_stacks + max(heights)
+    num_locations = spec.num_stacks + num_goal_stacks + num_buffers
+    columns = math.ceil(math.sqrt(num_locations))
+
+    init_config: Config = {}
+    names = [f"block_{i+1}" for i in range(spec.num_blocks)]
+
+    block_id = 0
+    for stack_id, height in enumerate(heights):
+        base = grid_location(stack_id, columns, spec.spacing)
+
+        for pos in tower_positions(base, height, spec.block_size):
+            name = names[block_id]
+            init_config[name] = {
+                "type": "static" if block_id < spec.num_static else "dynamic",
+                "position": pos,
+                "orientation": [0.0, 0.0, 0.0],
+                "color": [round(rng.random(), 3) for _ in range(3)],
+                "size": spec.block_size,
+            }
+            block_id += 1
+
+    # The robot starts outside the grid, clear of every stack
+    init_config["robot"] = {
+        "type": "robot",
+        "position": [-spec.spacing / 2, -spec.spacing / 2, 0.5],
+        "orientation": [0.0, 0.0, 0.0],
+    }
+
+    for buffer_id in range(num_buffers):
+        base = grid_location(spec.num_stacks + num_goal_stacks + buffer_id, columns, spec.spacing)
+        init_config[f"free_{buffer_id+1}"] = {
+            "type": "location",
+            "position": tower_positions(base, 1, spec.block_size)[0],
+        }
+
+    dynamic_blocks = names[spec.num_static:]
+    rng.shuffle(dynamic_blocks)
+
+    goal_config: Config = {}
+    if dynamic_blocks == []:
+        return init_config, goal_config
+
+    num_goal_stacks = min(num_goal_stacks, len(dynamic_blocks))
+    goal_heights = split_into_heights(rng, len(dynamic_blocks), num_goal_stacks, spec.goal_max_height)
+
+    block_id = 0
+    for goal_stack_id, height in enumerate(goal_heights):
+        base = grid_location(spec.num_stacks + goal_stack_id, columns, spec.spacing)
+
+        for pos in tower_positions(base, height, spec.block_size):
+            goal_config[dynamic_blocks[block_id]] = {"position": pos, "orientation": [0.0, 0.0, 0.0]}
+            block_id += 1
+
+    return init_config, goal_config
+
+def check_scenario(init_config: Config,
+                   goal_config: Config,
+                   solver: str = "gbfs",
+                   time_limit: Optional[float] = 60.0) -> bool:
+    """
+        Whether `solver` finds a plan for the scenario within `time_limit` seconds.
+    """
+    pp = PddlProblemParser("generated", "blocks", init_config=init_config, goal_config=goal_config)
+    result = solve_problem(load_domain("blocks"), pp.define_problem("generated"), solver=solver,
+                           time_limit=time_limit, first_plan=True)
+
+    return result.plan is not None
+
+def write_scenario(init_config: Config,
+                   goal_config: Config,
+                   config_name: str,
+                   problem_config_path: str = "config/problem_configs/") -> str:
+    config_dir = f"{problem_config_path}{config_name}/"
+    makedirs(config_dir, exist_ok=True)
+
+    with open(f"{config_dir}init.yaml", "w") as f:
+        safe_dump(init_config, f, sort_keys=False, default_flow_style=None)
+
+    with open(f"{config_dir}goal.yaml", "w") as f:
+        safe_dump(goal_config, f, sort_keys=False, default_flow_style=None)
+
+    return config_dir
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Generate a seeded blocks scenario config.")
+    arg_parser.add_argument("name", help="Config name, written to <path><name>/init.yaml and goal.yaml")
+    arg_parser.add_argument("--blocks", type=int, required=True)
+    arg_parser.add_argument("--stacks", type=int, required=True)
+    arg_parser.add_argument("--max-height", type=int, default=None)
+    arg_parser.add_argument("--goal-stacks", type=int, default=None)
+    arg_parser.add_argument("--goal-max-height", type=int, default=None)
+    arg_parser.add_argument("--static", type=int, default=0)
+    arg_parser.add_argument("--buffers", type=int, default=None, help="Free ground locations, default: goal stacks plus highest stack")
+    arg_parser.add_argument("--spacing", type=float, default=5.0)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--path", default="config/problem_configs/")
+    arg_parser.add_argument("--check", action="store_true", help="Solve the scenario with gbfs before writing it")
+    args = arg_parser.parse_args()
+
+    spec = ScenarioSpec(num_blocks=args.blocks,
+                        num_stacks=args.stacks,
+                        max_height=args.max_height,
+                        num_goal_stacks=args.goal_stacks,
+                        goal_max_height=args.goal_max_height,
+                        num_static=args.static,
+                        num_buffers=args.buffers,
+                        spacing=args.spacing,
+                        seed=args.seed)
+
+    init_config, goal_config = generate_scenario(spec)
+
+    if args.check and not check_scenario(init_config, goal_config):
+        print(f"gbfs found no plan for {args.name}, nothing written")
+        return
+
+    print(f"Wrote {write_scenario(init_config, goal_config, args.name, args.path)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import math
+
+from bisect import bisect_left, insort
+from itertools import product
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple, Optional, Sequence
+
+Cell = Tuple[int, int]
+StackEntry = Tuple[float, int, str]
+
+@dataclass
+class SpatialIndex:
+    """
+        Groups named points into vertical stacks: points whose planar distance to the first point of a
+        stack is within `threshold` belong to that stack. Stack anchors live in a planar grid with
+        `threshold` sized cells, so inserting or removing a point only looks at the neighbouring cells,
+        and every stack keeps its members sorted by height.
+    """
+    threshold: float = 0.5
+
+    cells: Dict[Cell, List[int]] = field(default_factory=lambda: {})
+    anchors: Dict[int, Tuple[float, float]] = field(default_factory=lambda: {})
+    stacks: Dict[int, List[StackEntry]] = field(default_factory=lambda: {})
+    stack_ids: Dict[str, int] = field(default_factory=lambda: {})
+    entries: Dict[str, StackEntry] = field(default_factory=lambda: {})
+    counter: int = 0
+
+    def __len__(self) -> int:
+        return len(self.stack_ids)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.stack_ids
+
+    def cell(self, x: float, y: float) -> Cell:
+        return math.floor(x / self.threshold), math.floor(y / self.threshold)
+
+    def find_stack_id(self, x: float, y: float) -> Optional[int]:
+        cx, cy = self.cell(x, y)
+
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for stack_id in self.cells.get((cx + dx, cy + dy), []):
+                    ax, ay = self.anchors[stack_id]
+
+                    if math.hypot(x - ax, y - ay) <= self.threshold:
+                        return stack_id
+
+        return None
+
+    def insert(self, name: str, pos: Sequence[float]) -> int:
+        """
+            Add a point and return the id of the stack it joined, starting a new stack if none is close enough.
+        """
+        if name in self.stack_ids:
+            self.remove(name)
+
+        x, y, z = pos[0], pos[1], pos[2]
+        stack_id = self.find_stack_id(x, y)
+
+        if stack_id is None:
+            stack_id = self.counter
+            self.anchors[stack_id] = (x, y)
+            self.cells.setdefault(self.cell(x, y), []).append(stack_id)
+            self.stacks[stack_id] = []
+
+        # The counter keeps insertion order between points at the same height
+        entry = (z, self.counter, name)
+        self.counter += 1
+
+        insort(self.stacks[stack_id], entry)
+        self.stack_ids[name] = stack_id
+        self.entries[name] = entry
+
+        return stack_id
+
+    def remove(self, name: str) -> None:
+        stack_id = self.stack_ids.pop(name)
+        entry = self.entries.pop(name)
+        stack = self.stacks[stack_id]
+
+        del stack[bisect_left(stack, entry)]
+
+        if stack == []:
+            del self.stacks[stack_id]
+            anchor = self.anchors.pop(stack_id)
+            self.cells[self.cell(*anchor)].remove(stack_id)
+
+    def move(self, name: str, pos: Sequence[float]) -> int:
+        self.remove(name)
+        return self.insert(name, pos)
+
+    def stack(self, name: str) -> List[str]:
+        """
+            Names in the stack of `name`, ordered bottom to top.
+        """
+        return [entry[2] for entry in self.stacks[self.stack_ids[name]]]
+
+    def same_stack(self, name: str, other: str) -> bool:
+        return self.stack_ids[name] == self.stack_ids[other]
+
+    def neighbour(self, name: str, offset: int) -> Optional[str]:
+        stack = self.stacks[self.stack_ids[name]]
+        i = bisect_left(stack, self.entries[name]) + offset
+
+        return stack[i][2] if 0 <= i < len(stack) else None
+
+    def below(self, name: str) -> Optional[str]:
+        return self.neighbour(name, -1)
+
+    def above(self, name: str) -> Optional[str]:
+        return self.neighbour(name, 1)
+
+    def all_stacks(self) -> List[List[str]]:
+        """
+            Every stack ordered bottom to top, stacks in the order they were started.
+        """
+        return [[entry[2] for entry in stack] for stack in self.stacks.values()]
+
+def index_from_points(points: Dict[str, Sequence[float]], threshold: float = 0.5) -> SpatialIndex:
+    index = SpatialIndex(threshold)
+
+    for name, pos in points.items():
+        index.insert(name, pos)
+
+    return index
+
+@dataclass
+class CoordinateIndex:
+    """
+        Hash of quantized coordinates for resolving a position to its name in O(1). Coordinates within
+        `tolerance` of each other in every axis resolve to the same, earliest added, name.
+    """
+    tolerance: float = 1e-6
+
+    cells: Dict[Tuple[int, ...], List[Tuple[int, str]]] = field(default_factory=lambda: {})
+    coords: Dict[str, Tuple[float, ...]] = field(default_factory=lambda: {})
+    order: Dict[str, int] = field(default_factory=lambda: {})
+    counter: int = 0
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    def key(self, pos: Sequence[float]) -> Tuple[int, ...]:
+        return tuple(math.floor(c / self.tolerance) for c in pos)
+
+    def add(self, name: str, pos: Sequence[float]) -> None:
+        if name in self.coords:
+            self.remove(name)
+
+        self.coords[name] = tuple(pos)
+        self.order[name] = self.counter
+        self.cells.setdefault(self.key(pos), []).append((self.counter, name))
+        self.counter += 1
+
+    def remove(self, name: str) -> None:
+        pos = self.coords.pop(name)
+        cell = self.cells[self.key(pos)]
+        cell.remove((self.order.pop(name), name))
+
+        if cell == []:
+            del self.cells[self.key(pos)]
+
+    def find(self, pos: Sequence[float]) -> Optional[str]:
+        # A match can sit in any neighbouring cell when it is close to a cell boundary
+        best: Optional[Tuple[int, str]] = None
+        key = self.key(pos)
+
+        for offset in product((-1, 0, 1), repeat=len(key)):
+            for order, name in self.cells.get(tuple(k + o for k, o in zip(key, offset)), []):
+                if best is not None and order > best[0]:
+                    continue
+
+                if all(abs(a - b) <= self.tolerance for a, b in zip(self.coords[name], pos)):
+                    best = (order, name)
+
+        return None if best is None else best[1]
+
+def coordinate_index_from_points(points: Dict[str, Sequence[float]], tolerance: float = 1e-6) -> CoordinateIndex:
+    index = CoordinateIndex(tolerance)
+
+    for name, pos in points.items():
+        index.add(name, pos)
+
+    return index
@@ -0,0 +1,275 @@
+import os
+import json
+import hashlib
+import tempfile
+
+from dataclasses import dataclass
+from typing import List, Dict, Tuple, Optional, Union, Any
+
+from pddl_parser.problem_writer import ProblemDefinition
+from planners.portfolio import Plan
+
+Atom = Tuple[str, Tuple[str, ...]]
+
+@dataclass
+class ProblemStructure:
+    objects: Dict[str, str]
+    init: List[Atom]
+    goal: List[Atom]
+    header: str
+
+def parse_sexp(text: str) -> List[Any]:
+    lines = [line.split(";", 1)[0] for line in text.splitlines()]
+    tokens = " ".join(lines).replace("(", " ( ").replace(")", " ) ").split()
+
+    stack: List[List[Any]] = [[]]
+    for token in tokens:
+        if token == "(":
+            stack.append([])
+        elif token == ")":
+            expr = stack.pop()
+            stack[-1].append(expr)
+        else:
+            stack[-1].append(token)
+
+    return stack[0]
+
+def to_atom(expr: List[Any]) -> Optional[Atom]:
+    """
+        Atoms, negated atoms and numeric fluents such as (= (distance p1 p2) 50). Numbers are folded into
+        the predicate, so only object names are left as arguments.
+    """
+    if expr == []:
+        return None
+
+    if expr[0] == "=" and len(expr) == 3 and isinstance(expr[1], list) and isinstance(expr[2], str):
+        atom = to_atom(expr[1])
+        return None if atom is None else (f"= {atom[0]} {expr[2]}", atom[1])
+
+    if expr[0] == "not" and len(expr) == 2 and isinstance(expr[1], list):
+        atom = to_atom(expr[1])
+        return None if atom is None else (f"not {atom[0]}", atom[1])
+
+    if all(isinstance(e, str) for e in expr):
+        return expr[0], tuple(expr[1:])
+
+    return None
+
+def typed_objects(expr: List[Any]) -> Dict[str, str]:
+    objects: Dict[str, str] = {}
+    names: List[str] = []
+    tokens = iter(expr)
+
+    for token in tokens:
+        if token == "-":
+            type_tag = next(tokens)
+            objects.update((name, type_tag) for name in names)
+            names = []
+        else:
+            names.append(token)
+
+    objects.update((name, "object") for name in names)
+    return objects
+
+def problem_structure(problem: Union[str, ProblemDefinition]) -> Optional[ProblemStructure]:
+    """
+        Objects, init and goal atoms of a problem, None when the goal is not a conjunction of literals.
+    """
+    parsed = parse_sexp(str(problem))
+    if parsed == [] or not isinstance(parsed[0], list) or parsed[0][0] != "define":
+        return None
+
+    sections = {section[0]: section[1:] for section in parsed[0][1:] if isinstance(section, list) and section != []}
+
+    init = [to_atom(expr) for expr in sections.get(":init", [])]
+    goal_expr = sections.get(":goal", [[]])[0]
+    goal_exprs = goal_expr[1:] if goal_expr != [] and goal_expr[0] == "and" else [goal_expr]
+    goal = [to_atom(expr) for expr in goal_exprs]
+
+    if None in init or None in goal:
+        return None
+
+    header = repr((sorted(sections.get(":requirements", [])), sections.get(":metric")))
+    return ProblemStructure(typed_objects(sections.get(":objects", [])), init, goal, header)
+
+def refine(colors: Dict[str, int], occurrences: Dict[str, List[Tuple[int, int]]], atoms: List[Tuple[str, Atom]]) -> Dict[str, int]:
+    """
+        Colour refinement: split objects by the colours of the atoms they appear in until the partition is stable.
+        Colours are ranks of sorted signatures, so they only depend on the structure and never on names.
+    """
+    num_colors = len(set(colors.values()))
+
+    while True:
+        signatures = {}
+        for obj, occurrence in occurrences.items():
+            signatures[obj] = (colors[obj], tuple(sorted((atoms[i][0], atoms[i][1][0], position, tuple(colors[a] for a in atoms[i][1][1]))
+                                                         for i, position in occurrence)))
+
+        ranks = {signature: rank for rank, signature in enumerate(sorted(set(signatures.values())))}
+        colors = {obj: ranks[signature] for obj, signature in signatures.items()}
+
+        if len(ranks) == num_colors:
+            return colors
+
+        num_colors = len(ranks)
+
+def canonical_names(structure: ProblemStructure) -> Dict[str, str]:
+    """
+        Rename objects so that problems that only differ in object names get the same canonical problem.
+        Ties left by refinement are broken by individualizing the first object of the smallest tied colour,
+        for symmetric objects any choice gives the same result.
+    """
+    atoms = [("init", atom) for atom in structure.init] + [("goal", atom) for atom in structure.goal]
+    occurrences: Dict[str, List[Tuple[int, int]]] = {obj: [] for obj in sorted(structure.objects)}
+
+    for i, (_, (_, args)) in enumerate(atoms):
+        for position, arg in enumerate(args):
+            occurrences.setdefault(arg, []).append((i, position))
+
+    # Domain constants keep their names, each gets a colour of its own after the object types
+    type_ranks = {type_tag: rank for rank, type_tag in enumerate(sorted(set(structure.objects.values())))}
+    constants = sorted(obj for obj in occurrences if obj not in structure.objects)
+    colors = {obj: type_ranks[structure.objects[obj]] for obj in structure.objects}
+    colors.update((constant, len(type_ranks) + rank) for rank, constant in enumerate(constants))
+    colors = refine(colors, occurrences, atoms)
+
+    while len(set(colors.values())) < len(colors):
+        classes: Dict[int, List[str]] = {}
+        for obj, color in colors.items():
+            classes.setdefault(color, []).append(obj)
+
+        tied = min(color for color, members in classes.items() if len(members) > 1)
+        chosen = min(classes[tied])
+        colors = {obj: 2 * color + (1 if color == tied and obj != chosen else 0) for obj, color in colors.items()}
+        colors = refine(colors, occurrences, atoms)
+
+    return {obj: f"o{color}" if obj in structure.objects else obj for obj, color in colors.items()}
+
+def canonical_text(structure: ProblemStructure, names: Dict[str, str]) -> str:
+    def rename(atom: Atom) -> str:
+        return f"({' '.join((atom[0],) + tuple(names[a] for a in atom[1]))})"
+
+    objects = sorted(f"{names[obj]} - {type_tag}" for obj, type_tag in structure.objects.items())
+    init = sorted(set(rename(atom) for atom in structure.init))
+    goal = sorted(set(rename(atom) for atom in structure.goal))
+
+    return "\n".join([structure.header, " ".join(objects), " ".join(init), " ".join(goal)])
+
+def problem_fingerprint(domain: str, problem: Union[str, ProblemDefinition]) -> Optional[Tuple[str, Dict[str, str]]]:
+    """
+        Hash of the domain and the canonical problem, and the renaming from problem objects to canonical names.
+        None when the problem cannot be canonicalized.
+    """
+    structure = problem_structure(problem)
+    if structure is None:
+        return None
+
+    names = canonical_names(structure)
+    domain_text = " ".join(str(parse_sexp(domain)).split())
+
+    digest = hashlib.sha256()
+    digest.update(domain_text.encode())
+    digest.update(canonical_text(structure, names).encode())
+
+    return digest.hexdigest(), names
+
+def evict_lru(cache_dir: str, suffix: str, max_entries: Optional[int], max_bytes: int) -> None:
+    """
+        Remove the least recently used `suffix` files of `cache_dir`, recency being the modification time,
+        until at most `max_entries` files and `max_bytes` bytes are left.
+    """
+    entries = []
+    for file_name in os.listdir(cache_dir):
+        if not file_name.endswith(suffix):
+            continue
+
+        try:
+            stat = os.stat(os.path.join(cache_dir, file_name))
+        except OSError:
+            continue
+
+        entries.append((stat.st_mtime, stat.st_size, file_name))
+
+    entries.sort()
+    total_bytes = sum(size for _, size, _ in entries)
+
+    while entries and ((max_entries is not None and len(entries) > max_entries) or total_bytes > max_bytes):
+        _, size, file_name = entries.pop(0)
+        total_bytes -= size
+
+        try:
+            os.remove(os.path.join(cache_dir, file_name))
+        except OSError:
+            pass
+
+def rename_plan(plan: Plan, names: Dict[str, str]) -> Plan:
+    return [(cmd, [names.get(arg, arg) for arg in args]) for cmd, args in plan]
+
+@dataclass
+class PlanCache:
+    """
+        Plans on disk, one JSON file per canonical problem, stored with canonical object names and renamed on
+        lookup. Files are replaced atomically so that parallel batch workers can share a cache. The least
+        recently used entries are evicted beyond `max_entries` or `max_bytes`.
+    """
+    cache_dir: str = "plan_cache/"
+    max_entries: int = 1024
+    max_bytes: int = 64 * 2**20
+    hits: int = 0
+    misses: int = 0
+
+    def entry_file(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def lookup(self, domain: str, problem: Union[str, ProblemDefinition]) -> Optional[Tuple[Plan, int]]:
+        fingerprint = problem_fingerprint(domain, problem)
+        entry = None if fingerprint is None else self.read_entry(fingerprint[0])
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        to_problem = {canonical: obj for obj, canonical in fingerprint[1].items()}
+        return rename_plan(entry["plan"], to_problem), entry["cost"]
+
+    def read_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.entry_file(key), 'r') as f:
+                entry = json.load(f)
+
+            # The modification time is the recency for eviction
+            os.utime(self.entry_file(key))
+        except (OSError, ValueError):
+            return None
+
+        return entry
+
+    def store(self, domain: str, problem: Union[str, ProblemDefinition], plan: Plan, cost: int, solver: str = "") -> bool:
+        """
+            Cache `plan` unless an entry at most as expensive exists. Returns whether the plan was stored.
+        """
+        fingerprint = problem_fingerprint(domain, problem)
+        if fingerprint is None:
+            return False
+
+        key, names = fingerprint
+        entry = self.read_entry(key)
+        if entry is not None and entry["cost"] <= cost:
+            return False
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+
+        with os.fdopen(fd, "w") as f:
+            json.dump({"cost": cost, "solver": solver, "plan": rename_plan(plan, names)}, f)
+
+        os.replace(tmp_file, self.entry_file(key))
+        self.evict()
+        return True
+
+    def evict(self) -> None:
+        evict_lru(self.cache_dir, ".json", self.max_entries, self.max_bytes)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
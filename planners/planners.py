@@ -0,0 +1,486 @@
+import re
+import heapq
+import time
+
+from dataclasses import dataclass, field
+from itertools import count
+from typing import List, Dict, Tuple, Optional, Set
+
+from pddl import parse_domain, parse_problem
+from pddl.logic.base import And, Not
+from pddl.logic.predicates import Predicate, EqualTo
+
+Atom = Tuple[str, ...]
+Literal = Tuple[bool, Atom]
+
+INF = float("inf")
+
+@dataclass
+class Operator:
+    name: str
+    args: List[str]
+
+    pre_pos: int
+    pre_neg: int
+    add: int
+    delete: int
+
+    pre_facts: List[int]
+    add_facts: List[int]
+    cost: int = 1
+
+    def applicable(self, state: int) -> bool:
+        return (state & self.pre_pos) == self.pre_pos and (state & self.pre_neg) == 0
+
+    def apply(self, state: int) -> int:
+        return (state & ~self.delete) | self.add
+
+@dataclass
+class GroundedTask:
+    facts: List[Atom] = field(default_factory=lambda: [])
+    fact_index: Dict[Atom, int] = field(default_factory=lambda: {})
+    operators: List[Operator] = field(default_factory=lambda: [])
+
+    init: int = 0
+    goal_pos: int = 0
+    goal_neg: int = 0
+    goal_facts: List[int] = field(default_factory=lambda: [])
+
+    def add_fact(self, atom: Atom) -> int:
+        idx = self.fact_index.get(atom)
+
+        if idx is None:
+            idx = len(self.facts)
+            self.facts.append(atom)
+            self.fact_index[atom] = idx
+
+        return idx
+
+    def goal_reached(self, state: int) -> bool:
+        return (state & self.goal_pos) == self.goal_pos and (state & self.goal_neg) == 0
+
+def bits_to_facts(bits: int) -> List[int]:
+    facts = []
+
+    while bits:
+        low = bits & -bits
+        facts.append(low.bit_length() - 1)
+        bits ^= low
+
+    return facts
+
+def to_atom(pred: Predicate, binding: Optional[Dict[str, str]] = None) -> Atom:
+    terms = [binding.get(t.name, t.name) if binding is not None else t.name for t in pred.terms]
+    return tuple([pred.name] + terms)
+
+def split_formula(formula) -> Tuple[List[Literal], List[Tuple[bool, str, str]]]:
+    """
+        Flatten a conjunction of (possibly negated) atoms and equalities into literal lists.
+    """
+    literals, equalities = [], []
+    operands = formula.operands if isinstance(formula, And) else [formula]
+
+    for operand in operands:
+        positive = not isinstance(operand, Not)
+        inner = operand if positive else operand.argument
+
+        if isinstance(inner, EqualTo):
+            equalities.append((positive, inner.left.name, inner.right.name))
+        elif isinstance(inner, Predicate):
+            literals.append((positive, to_atom(inner)))
+        else:
+            raise NotImplementedError(f"Unsupported formula {operand}")
+
+    return literals, equalities
+
+def objects_by_type(domain, problem) -> Dict[str, List[str]]:
+    parents = dict(domain.types)
+    typed_objects: Dict[str, List[str]] = {"object": []}
+
+    for obj in sorted(problem.objects, key=lambda o: o.name):
+        for type_tag in obj.type_tags:
+            t = type_tag
+            while t is not None:
+                typed_objects.setdefault(t, []).append(obj.name)
+                t = parents.get(t)
+
+        typed_objects["object"].append(obj.name)
+
+    return typed_objects
+
+def move_costs(problem_file: str) -> Dict[Tuple[str, str], int]:
+    """
+        The (= (distance from to) n) fluents of a problem with action costs, empty for unit cost problems.
+    """
+    with open(problem_file, 'r') as f:
+        text = f.read()
+
+    return {(from_pos, to_pos): int(cost) for from_pos, to_pos, cost in re.findall(r"\(=\s*\(distance\s+(\S+)\s+(\S+)\)\s*(\d+)\)", text)}
+
+def ground_task(domain_file: str, problem_file: str) -> GroundedTask:
+    domain = parse_domain(domain_file)
+    problem = parse_problem(problem_file)
+
+    task = GroundedTask()
+    typed_objects = objects_by_type(domain, problem)
+    init_atoms = {to_atom(p) for p in problem.init if isinstance(p, Predicate)}
+
+    schemas = []
+    fluents = set()
+    for a in domain.actions:
+        preconds, equalities = split_formula(a.precondition)
+        effects, _ = split_formula(a.effect)
+        fluents.update(atom[0] for _, atom in effects)
+        schemas.append((a, preconds, equalities, effects))
+
+    for atom in sorted(init_atoms):
+        if atom[0] in fluents:
+            task.init |= 1 << task.add_fact(atom)
+
+    for a, preconds, equalities, effects in schemas:
+        ground_action(task, a, preconds, equalities, effects, typed_objects, init_atoms, fluents)
+
+    goals, _ = split_formula(problem.goal)
+    for positive, atom in goals:
+        bit = 1 << task.add_fact(atom)
+
+        if positive:
+            task.goal_pos |= bit
+        else:
+            task.goal_neg |= bit
+
+    task.goal_facts = bits_to_facts(task.goal_pos)
+
+    # As in the action cost domain, moves cost their distance and every other action is free. Moves without
+    # a distance, e.g. to the ground, are not allowed there and would be free shortcuts here
+    costs = move_costs(problem_file)
+    if costs != {}:
+        task.operators = [op for op in task.operators if op.name != "move" or (op.args[1], op.args[2]) in costs]
+
+        for op in task.operators:
+            op.cost = costs[(op.args[1], op.args[2])] if op.name == "move" else 0
+
+    return task
+
+def ground_action(task: GroundedTask,
+                  action,
+                  preconds: List[Literal],
+                  equalities: List[Tuple[bool, str, str]],
+                  effects: List[Literal],
+                  typed_objects: Dict[str, List[str]],
+                  init_atoms: Set[Atom],
+                  fluents: Set[str]) -> None:
+    params = [(v.name, sorted(v.type_tags)[0] if v.type_tags else "object") for v in action.parameters]
+    param_names = [name for name, _ in params]
+
+    # Static literals and equalities are checked as soon as all of their variables are bound
+    static_checks: List[List] = [[] for _ in params]
+    for positive, atom in preconds:
+        if atom[0] in fluents:
+            continue
+
+        depth = max([param_names.index(t) for t in atom[1:] if t in param_names], default=0)
+        static_checks[depth].append(("atom", positive, atom))
+
+    for positive, left, right in equalities:
+        depth = max([param_names.index(t) for t in (left, right) if t in param_names], default=0)
+        static_checks[depth].append(("eq", positive, (left, right)))
+
+    binding: Dict[str, str] = {}
+
+    def consistent(depth: int) -> bool:
+        for kind, positive, payload in static_checks[depth]:
+            if kind == "eq":
+                holds = binding.get(payload[0], payload[0]) == binding.get(payload[1], payload[1])
+            else:
+                atom = tuple([payload[0]] + [binding.get(t, t) for t in payload[1:]])
+                holds = atom in init_atoms
+
+            if holds != positive:
+                return False
+
+        return True
+
+    def bind(depth: int) -> None:
+        if depth == len(params):
+            add_operator(task, action.name, [binding[name] for name in param_names], preconds, effects, binding, fluents)
+            return
+
+        name, type_tag = params[depth]
+        for obj in typed_objects.get(type_tag, []):
+            binding[name] = obj
+
+            if consistent(depth):
+                bind(depth + 1)
+
+        binding.pop(name, None)
+
+    if params:
+        bind(0)
+    else:
+        add_operator(task, action.name, [], preconds, effects, binding, fluents)
+
+def add_operator(task: GroundedTask,
+                 name: str,
+                 args: List[str],
+                 preconds: List[Literal],
+                 effects: List[Literal],
+                 binding: Dict[str, str],
+                 fluents: Set[str]) -> None:
+    pre_pos, pre_neg, add, delete = 0, 0, 0, 0
+
+    for positive, atom in preconds:
+        if atom[0] not in fluents:
+            continue
+
+        bit = 1 << task.add_fact(tuple([atom[0]] + [binding.get(t, t) for t in atom[1:]]))
+        if positive:
+            pre_pos |= bit
+        else:
+            pre_neg |= bit
+
+    for positive, atom in effects:
+        bit = 1 << task.add_fact(tuple([atom[0]] + [binding.get(t, t) for t in atom[1:]]))
+        if positive:
+            add |= bit
+        else:
+            delete |= bit
+
+    # Adds win over deletes of the same atom, as in PDDL
+    delete &= ~add
+    task.operators.append(Operator(name, args, pre_pos, pre_neg, add, delete, bits_to_facts(pre_pos), bits_to_facts(add)))
+
+@dataclass
+class RelaxedHeuristic:
+    """
+        Delete-relaxation heuristics h_add, h_max and h_FF computed with a Dijkstra-style
+        exploration over the grounded facts, ignoring negative preconditions.
+    """
+    task: GroundedTask
+    kind: str = "ff"
+
+    pre_to_ops: List[List[int]] = field(default_factory=lambda: [])
+    num_pre: List[int] = field(default_factory=lambda: [])
+    relaxed_plan: Set[int] = field(default_factory=lambda: set())
+
+    def __post_init__(self):
+        self.pre_to_ops = [[] for _ in self.task.facts]
+        self.num_pre = []
+
+        for op_id, op in enumerate(self.task.operators):
+            self.num_pre.append(len(op.pre_facts))
+            for f in op.pre_facts:
+                self.pre_to_ops[f].append(op_id)
+
+    def __call__(self, state: int) -> float:
+        operators = self.task.operators
+        use_max = self.kind == "max"
+
+        cost = [INF] * len(self.task.facts)
+        supporter = [-1] * len(self.task.facts)
+        unsatisfied = self.num_pre.copy()
+        acc = [0] * len(operators)
+        heap = []
+
+        for f in bits_to_facts(state):
+            cost[f] = 0
+            heap.append((0, f))
+
+        for op_id, n in enumerate(unsatisfied):
+            if n == 0:
+                self.relax(op_id, 0, cost, supporter, heap)
+
+        heapq.heapify(heap)
+        goals_left = len(self.task.goal_facts)
+        goal_set = set(self.task.goal_facts)
+
+        while heap and goals_left > 0:
+            c, f = heapq.heappop(heap)
+            if c > cost[f]:
+                continue
+
+            if f in goal_set:
+                goals_left -= 1
+
+            for op_id in self.pre_to_ops[f]:
+                unsatisfied[op_id] -= 1
+                acc[op_id] = max(acc[op_id], c) if use_max else acc[op_id] + c
+
+                if unsatisfied[op_id] == 0:
+                    self.relax(op_id, acc[op_id] + operators[op_id].cost, cost, supporter, heap)
+
+        goal_costs = [cost[g] for g in self.task.goal_facts]
+        if INF in goal_costs:
+            return INF
+
+        match self.kind:
+            case "add":
+                return sum(goal_costs)
+            case "max":
+                return max(goal_costs, default=0)
+            case "ff":
+                return self.relaxed_plan_cost(supporter, cost)
+            case _:
+                raise NotImplementedError(f"Undefined heuristic {self.kind}")
+
+    def relax(self, op_id: int, op_cost: float, cost: List[float], supporter: List[int], heap: List) -> None:
+        for g in self.task.operators[op_id].add_facts:
+            if op_cost < cost[g]:
+                cost[g] = op_cost
+                supporter[g] = op_id
+                heapq.heappush(heap, (op_cost, g))
+
+    def preferred_operators(self, state: int) -> Set[int]:
+        """
+            Operators of the last relaxed plan that are applicable in `state`, keyed by id().
+        """
+        if self.kind != "ff":
+            return set()
+
+        operators = self.task.operators
+        return {id(operators[op_id]) for op_id in self.relaxed_plan if operators[op_id].applicable(state)}
+
+    def relaxed_plan_cost(self, supporter: List[int], cost: List[float]) -> int:
+        relaxed_plan = set()
+        self.relaxed_plan = relaxed_plan
+        open_facts = [g for g in self.task.goal_facts if cost[g] > 0]
+        seen = set(open_facts)
+
+        while open_facts:
+            op_id = supporter[open_facts.pop()]
+            if op_id in relaxed_plan:
+                continue
+
+            relaxed_plan.add(op_id)
+            for f in self.task.operators[op_id].pre_facts:
+                if cost[f] > 0 and f not in seen:
+                    seen.add(f)
+                    open_facts.append(f)
+
+        return sum(self.task.operators[op_id].cost for op_id in relaxed_plan)
+
+def forward_search(task: GroundedTask,
+                   heuristic: RelaxedHeuristic,
+                   weight: Optional[float] = None,
+                   boost: int = 1000,
+                   time_limit: Optional[float] = None) -> Optional[List[Operator]]:
+    """
+        Lazy best-first search with preferred operators: successors are queued with their parent's
+        heuristic value and only evaluated when popped. Greedy best-first when `weight` is None,
+        weighted A* (f = g + w*h) otherwise. Preferred operators get their own queue, which is
+        alternated with the regular one and boosted whenever the best heuristic value improves.
+        Returns None when the task is unsolvable or `time_limit` seconds run out.
+    """
+    deadline = INF if time_limit is None else time.perf_counter() + time_limit
+    tie = count()
+    queues: List[List] = [[], []]
+    parents: Dict[int, Tuple[Optional[int], Optional[Operator]]] = {}
+    g_values: Dict[int, int] = {}
+
+    queues[0].append((0, next(tie), None, None, 0))
+    best_h = INF
+    preferred_budget = 0
+    turn = 0
+
+    while queues[0] or queues[1]:
+        if time.perf_counter() > deadline:
+            print("Search time limit reached")
+            return None
+
+        if preferred_budget > 0 and queues[1]:
+            queue = queues[1]
+            preferred_budget -= 1
+        else:
+            queue = queues[turn] if queues[turn] else queues[1 - turn]
+            turn = 1 - turn
+
+        _, _, parent, op, g = heapq.heappop(queue)
+        state = task.init if op is None else op.apply(parent)
+
+        # Greedy search never reopens states, weighted A* reopens them on cheaper paths
+        if state in g_values and (weight is None or g >= g_values[state]):
+            continue
+
+        g_values[state] = g
+        parents[state] = (parent, op)
+
+        if task.goal_reached(state):
+            return extract_plan(parents, state)
+
+        h = heuristic(state)
+        if h == INF:
+            continue
+
+        if h < best_h:
+            best_h = h
+            preferred_budget += boost
+
+        preferred = heuristic.preferred_operators(state)
+        priority = h if weight is None else g + weight * h
+
+        for succ_op in task.operators:
+            if not succ_op.applicable(state):
+                continue
+
+            entry = (priority, next(tie), state, succ_op, g + succ_op.cost)
+            heapq.heappush(queues[0], entry)
+
+            if id(succ_op) in preferred:
+                heapq.heappush(queues[1], entry)
+
+    return None
+
+def extract_plan(parents: Dict[int, Tuple[Optional[int], Optional[Operator]]], state: int) -> List[Operator]:
+    plan = []
+    parent, op = parents[state]
+
+    while parent is not None and op is not None:
+        plan.append(op)
+        parent, op = parents[parent]
+
+    plan.reverse()
+    return plan
+
+def validate_plan(task: GroundedTask, plan: List[Tuple[str, List[str]]]) -> bool:
+    operators = {(op.name, tuple(op.args)): op for op in task.operators}
+    state = task.init
+
+    for cmd, args in plan:
+        op = operators.get((cmd, tuple(args)))
+
+        if op is None or not op.applicable(state):
+            return False
+
+        state = op.apply(state)
+
+    return task.goal_reached(state)
+
+def solve(domain_file: str,
+          problem_file: str,
+          search: str = "gbfs",
+          heuristic: str = "ff",
+          weight: float = 5.0,
+          time_limit: Optional[float] = None) -> Optional[List[Tuple[str, List[str]]]]:
+    task = ground_task(domain_file, problem_file)
+    h = RelaxedHeuristic(task, heuristic)
+
+    match search:
+        case "gbfs":
+            plan = forward_search(task, h, time_limit=time_limit)
+        case "wastar":
+            plan = forward_search(task, h, weight, time_limit=time_limit)
+        case _:
+            print(f"Undefined search {search}")
+            raise NotImplementedError()
+
+    if plan is None:
+        return None
+
+    return [(op.name, op.args) for op in plan]
+
+def write_plan(plan: List[Tuple[str, List[str]]], plan_file: str, cost: Optional[int] = None) -> None:
+    with open(plan_file, "w") as f:
+        for cmd, args in plan:
+            f.write(f"({' '.join([cmd] + list(args))})\n")
+
+        f.write(f"; cost = {len(plan)} (unit cost)\n" if cost is None else f"; cost = {cost} (general cost)\n")
@@ -0,0 +1,233 @@
+import os
+import time
+import shutil
+import signal
+import tempfile
+import subprocess
+import multiprocessing as mp
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from queue import Empty
+from typing import List, Dict, Tuple, Optional, Any
+
+from planners.planners import solve, ground_task, validate_plan, move_costs
+
+Plan = List[Tuple[str, List[str]]]
+
+@dataclass
+class PlannerConfig:
+    name: str
+    solver: str
+    alias: str = "seq-sat-lama-2011"
+    options: Dict[str, Any] = field(default_factory=lambda: {})
+
+@dataclass
+class PortfolioResult:
+    config: PlannerConfig
+    plan: Plan
+    cost: int
+    time: float
+
+DEFAULT_PORTFOLIO = [
+    PlannerConfig("lama-2011", "downward", alias="seq-sat-lama-2011"),
+    PlannerConfig("lazy-greedy", "downward", alias="lama-first"),
+    PlannerConfig("fdss-2", "downward", alias="seq-sat-fdss-2"),
+    PlannerConfig("gbfs-ff", "gbfs", options={"heuristic": "ff"}),
+    PlannerConfig("wastar-ff", "wastar", options={"heuristic": "ff", "weight": 3.0}),
+]
+
+def downward_command(domain_file: str, problem_file: str, plan_file: str, alias: str, sas_file: str) -> List[str]:
+    """
+        Fast Downward translates to ./output.sas by default, so runs sharing a working directory need their own `sas_file`.
+    """
+    home = Path.home()
+    return f"{home}/downward/fast-downward.py --sas-file {sas_file} --plan-file {plan_file} --alias {alias} {domain_file} {problem_file}".split()
+
+def translate_command(domain_file: str, problem_file: str, sas_file: str) -> List[str]:
+    home = Path.home()
+    return f"{home}/downward/fast-downward.py --sas-file {sas_file} --translate {domain_file} {problem_file}".split()
+
+def search_command(sas_file: str, plan_file: str, alias: str) -> List[str]:
+    """
+        Fast Downward skips the translator when its only input is an already translated .sas file.
+    """
+    home = Path.home()
+    return f"{home}/downward/fast-downward.py --plan-file {plan_file} --alias {alias} {sas_file}".split()
+
+def parse_plan_text(text: str) -> Optional[Tuple[Plan, int]]:
+    """
+        Parse the text of a Fast Downward plan file into the plan and its cost, returning None while it
+        is still being written.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip() != ""]
+
+    if not lines or not lines[-1].startswith(";"):
+        return None
+
+    plan = []
+    for line in lines[:-1]:
+        cmd_line = line[1:-1].split(' ')
+        plan.append((cmd_line[0], cmd_line[1:]))
+
+    # The footer reads "; cost = <n> (unit cost)" or "; cost = <n> (general cost)"
+    footer = lines[-1].split()
+    cost = int(footer[3]) if len(footer) > 3 and footer[3].isdigit() else len(plan)
+
+    return plan, cost
+
+def plan_cost(plan: Plan, costs: Dict[Tuple[str, str], int]) -> int:
+    """
+        Cost of `plan` under the action cost domain, where moves cost their distance and every other action is free.
+        Without costs every action costs one.
+    """
+    if costs == {}:
+        return len(plan)
+
+    return sum(costs.get((args[1], args[2]), 0) for cmd, args in plan if cmd == "move")
+
+def native_worker(config: PlannerConfig, domain_file: str, problem_file: str, queue) -> None:
+    plan = solve(domain_file, problem_file, search=config.solver, **config.options)
+    queue.put(plan)
+
+@dataclass
+class PortfolioJob:
+    config: PlannerConfig
+    work_dir: str
+
+    process: Any = None
+    queue: Any = None
+    seen_plans: int = 0
+
+    @property
+    def plan_prefix(self) -> str:
+        return os.path.join(self.work_dir, "plan")
+
+    @property
+    def sas_file(self) -> str:
+        return os.path.join(self.work_dir, "output.sas")
+
+    def start(self, domain_file: str, problem_file: str, sas_file: Optional[str] = None) -> None:
+        if self.config.solver == "downward":
+            if sas_file is not None:
+                cmd = search_command(sas_file, self.plan_prefix, self.config.alias)
+            else:
+                cmd = downward_command(domain_file, problem_file, self.plan_prefix, self.config.alias, self.sas_file)
+
+            # New session so that the whole Fast Downward process group can be killed at once
+            self.process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        else:
+            self.queue = mp.Queue()
+            self.process = mp.Process(target=native_worker, args=(self.config, domain_file, problem_file, self.queue), daemon=True)
+            self.process.start()
+
+    def alive(self) -> bool:
+        if self.process is None:
+            return False
+
+        if isinstance(self.process, subprocess.Popen):
+            return self.process.poll() is None
+
+        return self.process.is_alive() or not self.queue.empty()
+
+    def new_plans(self, costs: Dict[Tuple[str, str], int]) -> List[Tuple[Plan, int]]:
+        """
+            Plans completed since the last call with their cost. Fast Downward reports its own cost, plans of
+            the native planners are costed with `costs`.
+        """
+        plans = []
+
+        if isinstance(self.process, subprocess.Popen):
+            # Anytime configurations write plan.1, plan.2, ... as better plans are found, the others just plan
+            files = sorted((f for f in os.listdir(self.work_dir) if f == "plan" or f.startswith("plan.")),
+                           key=lambda f: int(f.split(".")[-1]) if "." in f else 0)
+
+            for plan_file in files[self.seen_plans:]:
+                with open(os.path.join(self.work_dir, plan_file), 'r') as f:
+                    parsed = parse_plan_text(f.read())
+
+                if parsed is None:
+                    break
+
+                plans.append(parsed)
+                self.seen_plans += 1
+        else:
+            try:
+                plan = self.queue.get_nowait()
+                if plan is not None:
+                    plans.append((plan, plan_cost(plan, costs)))
+            except Empty:
+                pass
+
+        return plans
+
+    def kill(self) -> None:
+        if isinstance(self.process, subprocess.Popen):
+            if self.process.poll() is None:
+                os.killpg(self.process.pid, signal.SIGKILL)
+                self.process.wait()
+        elif self.process is not None and self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+def solve_portfolio(domain_file: str,
+                    problem_file: str,
+                    configs: List[PlannerConfig] = DEFAULT_PORTFOLIO,
+                    time_limit: float = 60.0,
+                    first_plan: bool = True,
+                    poll_interval: float = 0.05,
+                    sas_file: Optional[str] = None,
+                    cost_domain_file: Optional[str] = None) -> Optional[PortfolioResult]:
+    """
+        Run every configuration in parallel against the same problem. With `first_plan` the first
+        valid plan wins, otherwise the cheapest valid plan found within `time_limit` is returned.
+        All remaining planners are killed before returning. Fast Downward configurations search the
+        translated `sas_file` when given instead of each translating the problem again, and read
+        `cost_domain_file` when given, which only they can parse.
+    """
+    task = ground_task(domain_file, problem_file)
+    costs = move_costs(problem_file) if cost_domain_file is not None else {}
+    work_root = tempfile.mkdtemp(prefix="portfolio_")
+    jobs = []
+
+    for config in configs:
+        job = PortfolioJob(config, tempfile.mkdtemp(prefix=f"{config.name}_", dir=work_root))
+
+        try:
+            job_domain = cost_domain_file if config.solver == "downward" and cost_domain_file is not None else domain_file
+            job.start(job_domain, problem_file, sas_file)
+        except OSError as e:
+            print(f"Could not start planner {config.name}: {e}")
+            continue
+
+        jobs.append(job)
+
+    start = time.perf_counter()
+    best: Optional[PortfolioResult] = None
+
+    try:
+        while time.perf_counter() - start < time_limit:
+            running = False
+
+            for job in jobs:
+                running = job.alive() or running
+
+                for plan, cost in job.new_plans(costs):
+                    if not validate_plan(task, plan):
+                        print(f"Discarding invalid plan from {job.config.name}")
+                        continue
+
+                    if best is None or cost < best.cost:
+                        best = PortfolioResult(job.config, plan, cost, time.perf_counter() - start)
+
+            if (first_plan and best is not None) or not running:
+                break
+
+            time.sleep(poll_interval)
+    finally:
+        for job in jobs:
+            job.kill()
+
+        shutil.rmtree(work_root, ignore_errors=True)
+
+    return best
@@ -0,0 +1,230 @@
+import os
+import re
+import time
+import shutil
+import tempfile
+
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Optional, Any, Iterator, Union
+
+from pddl_parser.problem_writer import ProblemDefinition
+from planners.portfolio import Plan, PlannerConfig, PortfolioJob, move_costs
+from planners.plan_cache import PlanCache
+from planners.translation_cache import TranslationCache
+
+@dataclass
+class PlanResult:
+    plan: Plan
+    cost: int
+    # Seconds from the start of the run until the plan was read
+    time: float
+    index: int
+
+@dataclass
+class SolveResult:
+    solver: str
+    status: str
+    plans: List[PlanResult]
+    time: float
+    cached: bool = False
+
+    @property
+    def best(self) -> Optional[PlanResult]:
+        # Anytime planners only report improving plans, so the last of the cheapest is the one to keep
+        if self.plans == []:
+            return None
+
+        return min(reversed(self.plans), key=lambda result: result.cost)
+
+    @property
+    def plan(self) -> Optional[Plan]:
+        return None if self.best is None else self.best.plan
+
+def domain_path(domain_name: str, action_costs: bool = False, world_path: str = "pddl_worlds/blocks/") -> str:
+    return f"{world_path}{domain_name}_costs_domain.pddl" if action_costs else f"{world_path}{domain_name}_domain.pddl"
+
+def load_domain(domain_name: str, action_costs: bool = False, world_path: str = "pddl_worlds/blocks/") -> str:
+    """
+        Text of the domain file. The action cost domain is only readable by Fast Downward.
+    """
+    with open(domain_path(domain_name, action_costs, world_path), 'r') as f:
+        return f.read()
+
+@dataclass
+class PlanStream:
+    """
+        One planner run on domain and problem text. The texts go to a private temporary directory and
+        plans are parsed as soon as the planner finishes writing them, so anytime plans can be consumed
+        while the search goes on. Problems given as a ProblemDefinition are streamed to the file directly.
+        The planner process itself is a PortfolioJob, the same as in a portfolio run.
+    """
+    domain: str
+    problem: Union[str, ProblemDefinition]
+    solver: str = "downward"
+    alias: str = "seq-sat-lama-2011"
+    options: Dict[str, Any] = field(default_factory=lambda: {})
+    time_limit: Optional[float] = None
+    poll_interval: float = 0.05
+    translation_cache: Optional[TranslationCache] = None
+
+    work_dir: Optional[str] = None
+    job: Optional[PortfolioJob] = None
+    costs: Dict[Tuple[str, str], int] = field(default_factory=lambda: {})
+    plans: List[PlanResult] = field(default_factory=lambda: [])
+    start_time: float = 0.0
+    timed_out: bool = False
+
+    @property
+    def domain_file(self) -> str:
+        return os.path.join(self.work_dir, "domain.pddl")
+
+    @property
+    def problem_file(self) -> str:
+        return os.path.join(self.work_dir, "problem.pddl")
+
+    @property
+    def domain_name(self) -> str:
+        return re.search(r"\(domain\s+([^\s)]+)\)", self.domain).group(1)
+
+    @property
+    def action_costs(self) -> bool:
+        return ":action-costs" in self.domain
+
+    def start(self) -> None:
+        if self.solver not in ("downward", "gbfs", "wastar"):
+            print(f"Undefined solver {self.solver}")
+            raise NotImplementedError()
+
+        self.work_dir = tempfile.mkdtemp(prefix=f"{self.solver}_")
+
+        with open(self.domain_file, "w") as f:
+            f.write(self.domain)
+
+        with open(self.problem_file, "w") as f:
+            if isinstance(self.problem, ProblemDefinition):
+                self.problem.write(f)
+            else:
+                f.write(self.problem)
+
+        self.start_time = time.perf_counter()
+        self.costs = move_costs(self.problem_file)
+
+        # The native planners cannot parse the action cost domain, they read the costs from the problem instead
+        domain_file = self.domain_file
+        if self.action_costs and self.solver != "downward":
+            domain_file = domain_path(self.domain_name)
+
+        # A failed translation leaves the whole run to Fast Downward
+        sas_file = None
+        if self.solver == "downward" and self.translation_cache is not None:
+            sas_file = self.translation_cache.sas_file(self.domain_file, self.problem_file)
+
+        self.job = PortfolioJob(PlannerConfig(self.solver, self.solver, self.alias, self.options), self.work_dir)
+        self.job.start(domain_file, self.problem_file, sas_file)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start_time
+
+    def running(self) -> bool:
+        return self.job is not None and self.job.alive()
+
+    def add_plan(self, plan: Plan, cost: int) -> PlanResult:
+        result = PlanResult(plan, cost, self.elapsed(), len(self.plans) + 1)
+        self.plans.append(result)
+        return result
+
+    def poll(self) -> List[PlanResult]:
+        """
+            Plans completed since the last poll, without blocking. Stops the planner once `time_limit` has passed.
+        """
+        if self.job is None:
+            return []
+
+        new_plans = [self.add_plan(plan, cost) for plan, cost in self.job.new_plans(self.costs)]
+
+        if self.time_limit is not None and self.elapsed() > self.time_limit and self.running():
+            self.timed_out = True
+            self.kill()
+
+        return new_plans
+
+    def kill(self) -> None:
+        if self.job is not None:
+            self.job.kill()
+
+    def stop(self) -> None:
+        self.kill()
+
+        if self.work_dir is not None:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def status(self) -> str:
+        if self.plans != []:
+            return "solved"
+
+        return "timeout" if self.timed_out else "unsolved"
+
+    def result(self) -> SolveResult:
+        return SolveResult(self.solver, self.status(), list(self.plans), self.elapsed())
+
+    def __iter__(self) -> Iterator[PlanResult]:
+        try:
+            if self.job is None:
+                self.start()
+
+            while True:
+                # Checked before polling so that plans written just before the planner exits are not missed
+                running = self.running()
+
+                yield from self.poll()
+
+                if not running:
+                    break
+
+                time.sleep(self.poll_interval)
+        finally:
+            self.stop()
+
+    def __enter__(self) -> "PlanStream":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+def solve_problem(domain: str,
+                  problem: Union[str, ProblemDefinition],
+                  solver: str = "downward",
+                  time_limit: Optional[float] = None,
+                  first_plan: bool = False,
+                  cache: Optional[PlanCache] = None,
+                  **kwargs) -> SolveResult:
+    """
+        Solve without touching pddl_worlds/ or plans/. Anytime plans are collected until the planner stops,
+        `time_limit` runs out, or, with `first_plan`, as soon as one is found. With a `cache`, a plan of an
+        equivalent problem is returned without running the planner and new best plans are stored.
+    """
+    start = time.perf_counter()
+
+    if cache is not None:
+        cached = cache.lookup(domain, problem)
+
+        if cached is not None:
+            elapsed = time.perf_counter() - start
+            return SolveResult(solver, "solved", [PlanResult(cached[0], cached[1], elapsed, 1)], elapsed, cached=True)
+
+    stream = PlanStream(domain, problem, solver=solver, time_limit=time_limit, **kwargs)
+
+    try:
+        for _ in stream:
+            if first_plan:
+                break
+    finally:
+        stream.stop()
+
+    result = stream.result()
+
+    if cache is not None and result.best is not None:
+        cache.store(domain, problem, result.best.plan, result.best.cost, solver)
+
+    return result
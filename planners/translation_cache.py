@@ -0,0 +1,86 @@
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import subprocess
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from planners.portfolio import translate_command
+from planners.plan_cache import evict_lru
+
+@dataclass
+class TranslationCache:
+    """
+        Fast Downward translator output, one .sas file per exact domain and problem text. Search runs on a
+        cached file skip the translator altogether. Files are written under a temporary name and renamed,
+        so parallel workers can share the directory. Clear it after updating Fast Downward.
+    """
+    cache_dir: str = "translation_cache/"
+    max_bytes: int = 512 * 2**20
+    hits: int = 0
+    misses: int = 0
+    translate_time: float = 0.0
+
+    def __post_init__(self):
+        # Cached files are handed to searches that may run from another working directory
+        self.cache_dir = os.path.abspath(self.cache_dir)
+
+    def key(self, domain_file: str, problem_file: str) -> str:
+        digest = hashlib.sha256()
+
+        for file_name in (domain_file, problem_file):
+            with open(file_name, 'rb') as f:
+                digest.update(f.read())
+
+            # Keeps the two texts apart, so moving text from one file to the other changes the key
+            digest.update(b"\0")
+
+        return digest.hexdigest()
+
+    def entry_file(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.sas")
+
+    def sas_file(self, domain_file: str, problem_file: str) -> Optional[str]:
+        """
+            The translated task, translating it on a miss. None when the translator fails.
+        """
+        sas_file = self.entry_file(self.key(domain_file, problem_file))
+
+        # The translator runs inside its own work directory, so the inputs have to be absolute
+        domain_file, problem_file = os.path.abspath(domain_file), os.path.abspath(problem_file)
+
+        if os.path.exists(sas_file):
+            self.hits += 1
+
+            # The modification time is the recency for eviction
+            os.utime(sas_file)
+            return sas_file
+
+        self.misses += 1
+        os.makedirs(self.cache_dir, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix="translate_", dir=self.cache_dir)
+
+        try:
+            start = time.perf_counter()
+            tmp_file = os.path.join(work_dir, "output.sas")
+            translate = subprocess.run(translate_command(domain_file, problem_file, tmp_file),
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=work_dir)
+            self.translate_time += time.perf_counter() - start
+
+            if translate.returncode != 0 or not os.path.exists(tmp_file):
+                print(f"Translating {problem_file} failed with exit code {translate.returncode}")
+                return None
+
+            # Older entries make room first, so the new one is never evicted right away
+            evict_lru(self.cache_dir, ".sas", None, self.max_bytes - os.path.getsize(tmp_file))
+            os.replace(tmp_file, sas_file)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        return sas_file
+
+    def stats(self) -> Dict[str, float]:
+        return {"hits": self.hits, "misses": self.misses, "translate_time": self.translate_time}
@@ -1,7 +1,7 @@
 import copy
 
 from dataclasses import dataclass, field
-from typing import List, Dict, Callable, Tuple, Any, NewType, Type
+from typing import List, Dict, Callable, Tuple, Any, NewType, Type, Optional, Union
 from functools import wraps
 from abc import abstractmethod
 
@@ -21,7 +21,7 @@ class Pose(Thing):
 @dataclass
 class Object(Thing):
     init_pose: Pose
-    goal_pose: Pose = Pose("Nan", (-1, -1, -1))
+    goal_pose: Pose = field(default_factory=lambda: Pose("Nan", (-1, -1, -1)))
 
     def __post_init__(self):
         self.pose = self.init_pose
@@ -45,6 +45,12 @@ class Predicate:
 
         self.evaluated_predicates[arg_names] = true
 
+    def peek(self, *args) -> bool:
+        arg_names = tuple([arg.name for arg in args])
+        true = self.evaluated_predicates.get(arg_names)
+
+        return self.eval(*args) if true is None else true
+
     def __call__(self, *args) -> bool:
         arg_names = tuple([arg.name for arg in args])
         if arg_names not in self.evaluated_predicates.keys():
@@ -52,16 +58,118 @@ class Predicate:
 
         return self.evaluated_predicates[arg_names]
 
+@dataclass
+class StateHistory:
+    """
+        Delta-encoded sequence of states. Every step only stores the predicate entries that changed
+        from the previous step, with a full snapshot kept every `checkpoint_interval` steps so that
+        any past state can be rebuilt from the nearest snapshot. The latest state is kept materialized.
+    """
+    checkpoint_interval: int = 16
+
+    deltas: List[State] = field(default_factory=lambda: [])
+    checkpoints: Dict[int, State] = field(default_factory=lambda: {})
+    head: Optional[State] = None
+
+    def __len__(self) -> int:
+        return len(self.deltas)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, idx: Union[int, slice]) -> Any:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+
+        if idx < 0:
+            idx += len(self)
+
+        if idx < 0 or idx >= len(self):
+            raise IndexError("state index out of range")
+
+        if idx == len(self) - 1:
+            return self.head
+
+        return self.materialize(idx)
+
+    def materialize(self, idx: int) -> State:
+        checkpoint_idx = max(i for i in self.checkpoints.keys() if i <= idx)
+        checkpoint = self.checkpoints[checkpoint_idx]
+        state = State({pred_name: dict(pred) for pred_name, pred in checkpoint.items()})
+
+        for delta in self.deltas[checkpoint_idx+1:idx+1]:
+            for pred_name, changes in delta.items():
+                state.setdefault(pred_name, {}).update(changes)
+
+        return state
+
+    def append(self, state: State):
+        if self.head is None or any(pred_name not in state for pred_name in self.head.keys()):
+            self._push(state, {}, force_checkpoint=True)
+            return
+
+        delta = State({})
+        for pred_name, pred in state.items():
+            head_pred = self.head.get(pred_name, {})
+            changes = {key: true for key, true in pred.items() if head_pred.get(key) != true}
+
+            if changes:
+                delta[pred_name] = changes
+
+        # Entries can only be added or flipped by a delta, so dropped entries need a fresh snapshot
+        dropped = any(key not in state[pred_name] for pred_name, head_pred in self.head.items() for key in head_pred)
+        self._push(state, delta, force_checkpoint=dropped)
+
+    def apply(self, changes: State):
+        assert self.head is not None, "State history has not been initialized"
+
+        # Copy-on-write: only the predicate tables touched by the update are copied
+        new_head = State(dict(self.head))
+        delta = State({})
+
+        for pred_name, pred in changes.items():
+            head_pred = self.head.get(pred_name, {})
+            pred_delta = {key: true for key, true in pred.items() if head_pred.get(key) != true}
+
+            if not pred_delta and pred_name in self.head:
+                continue
+
+            new_pred = dict(head_pred)
+            new_pred.update(pred_delta)
+            new_head[pred_name] = new_pred
+            delta[pred_name] = pred_delta
+
+        self._push(new_head, delta)
+
+    def _push(self, state: State, delta: State, force_checkpoint: bool = False):
+        idx = len(self.deltas)
+        self.deltas.append(delta)
+        self.head = state
+
+        # Snapshots own their predicate tables, so in-place changes to the head cannot rewrite past states
+        if force_checkpoint or idx % self.checkpoint_interval == 0:
+            self.checkpoints[idx] = State({pred_name: dict(pred) for pred_name, pred in state.items()})
+
 @dataclass
 class States:
     objects: Dict[str, Object]
     poses: Dict[str, Pose]
 
     init_states: State
-    states: List[State]
+    states: StateHistory
     goal_states: State
 
-    predicates: Dict[str, Type[Predicate]] = field(default_factory=lambda: {})
+    predicates: Dict[str, Predicate] = field(default_factory=lambda: {})
+
+    def __post_init__(self):
+        if not isinstance(self.states, StateHistory):
+            history = StateHistory()
+
+            for state in self.states:
+                history.append(state)
+
+            self.states = history
 
     def get_obj_of_type(self, obj_name: str, type_: Any) -> Any:
         obj = self.objects[obj_name]
@@ -73,18 +181,7 @@ class States:
         self.states.append(copy.deepcopy(self.init_states))
 
     def update_states(self, new_state: State):
-        current_state = copy.deepcopy(self.current_state)
-
-        for pred_name, pred in new_state.items():
-            current_state_pred = current_state.get(pred_name)
-
-            if current_state_pred is None:
-                current_state[pred_name] = pred
-            else:
-                for args_key, true in pred.items():
-                    current_state_pred[args_key] = true
-
-        self.states.append(current_state)
+        self.states.apply(new_state)
 
     @property
     def current_state(self):
@@ -122,68 +219,125 @@ class ActionResults:
     def success(self):
         return self.failed_preconds == []
 
+@dataclass
+class CompiledCondition:
+    predicate: Predicate
+    name: str
+    slots: Tuple[str, ...]
+    true: bool
+
+    def args(self, kwargs: Dict) -> List[Thing]:
+        return [kwargs[slot] for slot in self.slots]
+
+    def key(self, kwargs: Dict) -> Tuple[str, ...]:
+        return tuple([kwargs[slot].name for slot in self.slots])
+
+    def lookup(self, state: State, kwargs: Dict) -> bool:
+        true = state.get(self.name, {}).get(self.key(kwargs))
+        return self.predicate.peek(*self.args(kwargs)) if true is None else true
+
+@dataclass
+class ActionSchema:
+    """
+        Preconditions and effects of an action compiled once at decoration time. Effects are split
+        into add and delete lists, and `apply` only copies the predicate tables the effects touch.
+    """
+    name: str
+    params: Tuple[str, ...]
+    preconds: List[CompiledCondition]
+    add_effects: List[CompiledCondition]
+    del_effects: List[CompiledCondition]
+
+    @property
+    def effects(self) -> List[CompiledCondition]:
+        return self.del_effects + self.add_effects
+
+    def apply(self, state: State, kwargs: Dict) -> State:
+        new_state = State(dict(state))
+        copied = set()
+
+        for effect in self.effects:
+            if effect.name not in copied:
+                new_state[effect.name] = dict(state.get(effect.name, {}))
+                copied.add(effect.name)
+
+            new_state[effect.name][effect.key(kwargs)] = effect.true
+
+        return new_state
+
+    def applicable(self, state: State, kwargs: Dict) -> bool:
+        return all(precond.lookup(state, kwargs) == precond.true for precond in self.preconds)
+
+    def successor(self, state: State, kwargs: Dict) -> Optional[State]:
+        if not self.applicable(state, kwargs):
+            return None
+
+        return self.apply(state, kwargs)
+
+def compile_condition(condition: Condition) -> CompiledCondition:
+    cond_def, cond_types, true = condition
+    return CompiledCondition(cond_def, cond_def.name, tuple(cond_types.keys()), true)
+
+def compile_action(name: str, preconds: List[Condition], effects: List[Condition]) -> ActionSchema:
+    compiled_preconds = [compile_condition(precond) for precond in preconds]
+    compiled_effects = [compile_condition(effect) for effect in effects]
+
+    params = []
+    for cond in compiled_preconds + compiled_effects:
+        params.extend([slot for slot in cond.slots if slot not in params])
+
+    add_effects = [effect for effect in compiled_effects if effect.true]
+    del_effects = [effect for effect in compiled_effects if not effect.true]
+
+    return ActionSchema(name, tuple(params), compiled_preconds, add_effects, del_effects)
+
 def action(preconds: List[Condition], effects: List[Condition]):
     def decorator(func):
+        schema = compile_action(func.__name__, preconds, effects)
+
         @wraps(func)
 
         def wrapper(state: State, **kwargs) -> ActionResults:
-            new_state = copy.deepcopy(state)
-            failed_preconds = find_failed_preconditions(new_state, kwargs, preconds)
+            failed_preconds = find_failed_preconditions(state, kwargs, schema.preconds)
 
             if failed_preconds == {}:
                 action_results = func(state, **kwargs)
                 result = action_results.result
+                new_state = schema.apply(state, kwargs)
 
-                for effect in effects:
-                    effect_def, effect_name, effect_dict_keys, effect_args, true = unpack_conditions(effect, kwargs)
-                    new_state[effect_name] = {effect_dict_keys: true}
-                    effect_def.update(*effect_args, true)
+                for effect in schema.effects:
+                    effect.predicate.update(*effect.args(kwargs), effect.true)
 
             else:
+                new_state = State(dict(state))
                 result = "Failed"
 
             return ActionResults(failed_preconds, new_state, result)
+
+        wrapper.preconds = preconds # type: ignore
+        wrapper.effects = effects # type: ignore
+        wrapper.schema = schema # type: ignore
+
+        # Dry-run API: only reads the state and the domain objects, so it is safe to call in bulk or from threads
+        wrapper.applicable = lambda state, **kwargs: schema.applicable(state, kwargs) # type: ignore
+        wrapper.successor = lambda state, **kwargs: schema.successor(state, kwargs) # type: ignore
+        wrapper.failed_preconditions = lambda state, **kwargs: find_failed_preconditions(state, kwargs, schema.preconds, pure=True) # type: ignore
         return wrapper
     return decorator
 
-def find_failed_preconditions(state: State, kwargs: Dict, preconditions: List[Condition]) -> Dict[str, Condition]:
+def find_failed_preconditions(state: State, kwargs: Dict, preconditions: List[CompiledCondition], pure: bool = False) -> Dict[str, Condition]:
     failed_preconditions = {}
     for precond in preconditions:
-        precond_def, precond_name, precond_dict_keys, precond_args, true = unpack_conditions(precond, kwargs)
+        precond_dict_keys = precond.key(kwargs)
+        actual_pred_state = state.get(precond.name, {}).get(precond_dict_keys)
+        precond_args = precond.args(kwargs)
 
-        if precond_name not in state.keys():
-            predicate = {precond_dict_keys: precond_def(*precond_args)}
-            state[precond_name] = predicate
-            actual_pred_state = predicate[precond_dict_keys]
-        else:
-            predicate = state[precond_name]
+        if actual_pred_state is None:
+            # Pure lookups skip the predicate cache, which is shared with the parsed init state
+            actual_pred_state = precond.predicate.peek(*precond_args) if pure else precond.predicate(*precond_args)
 
-            if precond_dict_keys not in predicate.keys():
-                actual_pred_state = precond_def(*precond_args)
-            else:
-                actual_pred_state = predicate[precond_dict_keys]
-
-        condition_dict = {}
-        for key, arg in zip(precond_dict_keys, precond_args):
-            condition_dict[key] = arg
-
-        if actual_pred_state != true:
-            failed_preconditions[precond_name] = Condition((precond_def, condition_dict, actual_pred_state))
+        if actual_pred_state != precond.true:
+            condition_dict = dict(zip(precond_dict_keys, precond_args))
+            failed_preconditions[precond.name] = Condition((precond.predicate, condition_dict, actual_pred_state))
 
     return failed_preconditions
-
-def unpack_conditions(condition: Condition, kwargs: Dict) -> Tuple[Callable, str, Tuple[str, ...], List, bool]:
-    cond_def, cond_types, true = condition
-    cond_name = cond_def.name
-    cond_type_names = cond_types.keys()
-
-    cond_dict_keys = []
-    cond_args = []
-
-    for name in cond_type_names:
-        cond_arg = kwargs[name]
-        cond_dict_keys.append(cond_arg.name)
-        cond_args.append(cond_arg)
-
-    cond_dict_keys = tuple(cond_dict_keys)
-    return cond_def, cond_name, cond_dict_keys, cond_args, true
\ No newline at end of file
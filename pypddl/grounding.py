@@ -0,0 +1,147 @@
+import inspect
+
+from dataclasses import dataclass, field
+from itertools import product
+from typing import List, Dict, Callable, Tuple, NewType, Iterable
+
+from pypddl.core import State, States, Thing, Predicate, Condition
+
+BitState = NewType("BitState", int)
+Fact = NewType("Fact", Tuple[str, Tuple[str, ...]])
+
+@dataclass
+class GroundedAction:
+    name: str
+    args: Dict[str, Thing]
+
+    pre_pos: int
+    pre_neg: int
+    add: int
+    delete: int
+
+    def applicable(self, bits: BitState) -> bool:
+        return (bits & self.pre_pos) == self.pre_pos and (bits & self.pre_neg) == 0
+
+    def apply(self, bits: BitState) -> BitState:
+        return BitState((bits & ~self.delete) | self.add)
+
+@dataclass
+class Grounding:
+    """
+        Maps every (predicate, argument names) pair over the objects and poses of a `States`
+        to a bit index, so states become plain ints and condition checks become mask operations.
+    """
+    things: Dict[str, Thing]
+    predicates: Dict[str, Predicate]
+
+    facts: List[Fact] = field(default_factory=lambda: [])
+    fact_index: Dict[Fact, int] = field(default_factory=lambda: {})
+    goal_mask: int = 0
+
+    actions: Dict[Tuple[str, Tuple[str, ...]], GroundedAction] = field(default_factory=lambda: {})
+
+    def __post_init__(self):
+        for pred_name, pred in self.predicates.items():
+            for args in self.candidate_args(pred):
+                self.add_fact(Fact((pred_name, tuple(arg.name for arg in args))))
+
+    def candidate_args(self, pred: Predicate) -> Iterable[Tuple[Thing, ...]]:
+        params = inspect.signature(pred.eval).parameters.values()
+        domains = [[t for t in self.things.values() if isinstance(t, param.annotation)] for param in params]
+
+        return product(*domains)
+
+    def add_fact(self, fact: Fact) -> int:
+        idx = self.fact_index.get(fact)
+
+        if idx is None:
+            idx = len(self.facts)
+            self.facts.append(fact)
+            self.fact_index[fact] = idx
+
+        return idx
+
+    def bit(self, pred_name: str, arg_names: Tuple[str, ...]) -> int:
+        return 1 << self.fact_index[Fact((pred_name, arg_names))]
+
+    def encode(self, state: State) -> BitState:
+        bits = 0
+
+        for idx, (pred_name, arg_names) in enumerate(self.facts):
+            true = state.get(pred_name, {}).get(arg_names)
+
+            # Entries missing from the state fall back to the predicate's own evaluation
+            if true is None:
+                pred = self.predicates[pred_name]
+                true = pred.eval(*[self.things[name] for name in arg_names])
+
+            if true:
+                bits |= 1 << idx
+
+        return BitState(bits)
+
+    def decode(self, bits: BitState) -> State:
+        state = State({pred_name: {} for pred_name in self.predicates.keys()})
+
+        for idx, (pred_name, arg_names) in enumerate(self.facts):
+            state.setdefault(pred_name, {})[arg_names] = bool((bits >> idx) & 1)
+
+        return state
+
+    def true_facts(self, bits: BitState) -> List[Fact]:
+        return [self.facts[idx] for idx in range(len(self.facts)) if (bits >> idx) & 1]
+
+    def condition_masks(self, conditions: List[Condition], kwargs: Dict[str, Thing]) -> Tuple[int, int]:
+        pos, neg = 0, 0
+
+        for cond_def, cond_types, true in conditions:
+            arg_names = tuple(kwargs[name].name for name in cond_types.keys())
+            self.predicates.setdefault(cond_def.name, cond_def)
+            bit = 1 << self.add_fact(Fact((cond_def.name, arg_names)))
+
+            if true:
+                pos |= bit
+            else:
+                neg |= bit
+
+        return pos, neg
+
+    def ground_action(self, action: Callable, **kwargs) -> GroundedAction:
+        key = (action.__name__, tuple(f"{k}={v.name}" for k, v in kwargs.items()))
+        grounded = self.actions.get(key)
+
+        if grounded is None:
+            pre_pos, pre_neg = self.condition_masks(action.preconds, kwargs) # type: ignore
+            add, delete = self.condition_masks(action.effects, kwargs) # type: ignore
+
+            grounded = GroundedAction(action.__name__, kwargs, pre_pos, pre_neg, add, delete)
+            self.actions[key] = grounded
+
+        return grounded
+
+    def failed_preconditions(self, grounded: GroundedAction, bits: BitState) -> List[Tuple[Fact, bool]]:
+        failed = []
+        missing_pos = grounded.pre_pos & ~bits
+        present_neg = grounded.pre_neg & bits
+
+        for idx in range(len(self.facts)):
+            if (missing_pos >> idx) & 1:
+                failed.append((self.facts[idx], True))
+            elif (present_neg >> idx) & 1:
+                failed.append((self.facts[idx], False))
+
+        return failed
+
+    def goal_reached(self, bits: BitState) -> bool:
+        return (bits & self.goal_mask) == self.goal_mask
+
+def ground(states: States) -> Grounding:
+    things = {**states.poses, **states.objects}
+    grounding = Grounding(things, dict(states.predicates))
+
+    # Goal entries are conditions that have to hold, mirroring `States.goal_reached`
+    for pred_name, pred in states.goal_states.items():
+        for arg_names in pred.keys():
+            grounding.goal_mask |= 1 << grounding.add_fact(Fact((pred_name, arg_names)))
+
+    return grounding
@@ -0,0 +1,223 @@
+import numpy as np
+
+from dataclasses import dataclass, field
+from itertools import product
+from typing import List, Callable, Optional, Tuple
+
+from pypddl.grounding import Grounding, GroundedAction, BitState
+
+INF = np.inf
+
+@dataclass
+class RelaxedEvaluation:
+    bits: BitState
+    state_mask: np.ndarray
+    fact_cost: np.ndarray
+    supporter: np.ndarray
+    h: float
+
+def ground_operators(grounding: Grounding, actions: List[Callable]) -> List[GroundedAction]:
+    operators = []
+
+    for action in actions:
+        slot_types = {}
+        for _, cond_types, _ in action.preconds + action.effects: # type: ignore
+            slot_types.update(cond_types)
+
+        slots = list(slot_types.keys())
+        domains = [[t for t in grounding.things.values() if isinstance(t, type_)] for type_ in slot_types.values()]
+
+        for things in product(*domains):
+            # The same thing never fills two slots of an action, e.g. moving from a pose to itself
+            if len(set(id(t) for t in things)) < len(things):
+                continue
+
+            operators.append(grounding.ground_action(action, **dict(zip(slots, things))))
+
+    return operators
+
+@dataclass
+class RelaxedPlanningGraph:
+    """
+        Delete-relaxed planning graph over a grounded task, stored as flat NumPy arrays so that each
+        layer update is a handful of vectorized reductions. h_max, h_add and h_FF are supported, and
+        successor states can be evaluated incrementally from their parent's evaluation.
+    """
+    grounding: Grounding
+    operators: List[GroundedAction]
+    kind: str = "ff"
+    max_invalidated: float = 0.5
+
+    num_facts: int = 0
+    op_cost: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    goal_facts: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+
+    # Precondition edges sorted by operator, add edges sorted by fact
+    pre_op: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    pre_fact: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    pre_ptr: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    add_op: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    add_fact: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+
+    def __post_init__(self):
+        self.num_facts = len(self.grounding.facts)
+        self.op_cost = np.ones(len(self.operators))
+
+        pre_op, pre_fact, add_op, add_fact = [], [], [], []
+        for op_id, op in enumerate(self.operators):
+            for f in bit_indices(op.pre_pos):
+                pre_op.append(op_id)
+                pre_fact.append(f)
+
+            for f in bit_indices(op.add):
+                add_op.append(op_id)
+                add_fact.append(f)
+
+        self.pre_op = np.array(pre_op, dtype=np.int64)
+        self.pre_fact = np.array(pre_fact, dtype=np.int64)
+        self.pre_ptr = np.searchsorted(self.pre_op, np.arange(len(self.operators) + 1))
+
+        order = np.argsort(np.array(add_fact, dtype=np.int64), kind="stable")
+        self.add_op = np.array(add_op, dtype=np.int64)[order]
+        self.add_fact = np.array(add_fact, dtype=np.int64)[order]
+
+        # Segment boundaries for the per-operator and per-fact reductions
+        self._pre_ops, self._pre_starts = np.unique(self.pre_op, return_index=True)
+        self._add_facts, self._add_starts = np.unique(self.add_fact, return_index=True)
+
+        self.goal_facts = np.array(bit_indices(self.grounding.goal_mask), dtype=np.int64)
+
+    def state_mask(self, bits: BitState) -> np.ndarray:
+        raw = np.frombuffer(bits.to_bytes((self.num_facts + 7) // 8, "little"), dtype=np.uint8)
+        return np.unpackbits(raw, bitorder="little")[:self.num_facts].astype(bool)
+
+    def operator_values(self, fact_cost: np.ndarray) -> np.ndarray:
+        op_val = np.zeros(len(self.operators))
+
+        if len(self.pre_fact) > 0:
+            reduce = np.maximum if self.kind == "max" else np.add
+            op_val[self._pre_ops] = reduce.reduceat(fact_cost[self.pre_fact], self._pre_starts)
+
+        return op_val
+
+    def propagate(self, fact_cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Iterate layer updates until the fact costs reach their fixpoint. `fact_cost` has to be an
+            upper bound on the true costs, which holds both for a fresh graph and for an incremental one.
+        """
+        while True:
+            op_val = self.operator_values(fact_cost)
+            achiever_cost = op_val[self.add_op] + self.op_cost[self.add_op]
+
+            new_cost = fact_cost.copy()
+            best = np.minimum.reduceat(achiever_cost, self._add_starts)
+            new_cost[self._add_facts] = np.minimum(new_cost[self._add_facts], best)
+
+            if np.array_equal(new_cost, fact_cost):
+                return fact_cost, op_val
+
+            fact_cost = new_cost
+
+    def best_supporters(self, fact_cost: np.ndarray, op_val: np.ndarray, state_mask: np.ndarray) -> np.ndarray:
+        achiever_cost = op_val[self.add_op] + self.op_cost[self.add_op]
+
+        supporter = np.full(self.num_facts, -1, dtype=np.int64)
+        is_best = (achiever_cost == fact_cost[self.add_fact]) & ~state_mask[self.add_fact]
+        supporter[self.add_fact[is_best]] = self.add_op[is_best]
+
+        return supporter
+
+    def evaluate(self, bits: BitState, parent: Optional[RelaxedEvaluation] = None) -> RelaxedEvaluation:
+        state_mask = self.state_mask(bits)
+        fact_cost = None if parent is None else self.invalidate(parent, state_mask)
+
+        if fact_cost is None:
+            fact_cost = np.where(state_mask, 0.0, INF)
+
+        fact_cost, op_val = self.propagate(fact_cost)
+        supporter = self.best_supporters(fact_cost, op_val, state_mask)
+
+        return RelaxedEvaluation(bits, state_mask, fact_cost, supporter, self.heuristic_value(fact_cost, supporter))
+
+    def invalidate(self, parent: RelaxedEvaluation, state_mask: np.ndarray) -> Optional[np.ndarray]:
+        """
+            Start from the parent's costs and reset every fact whose best support depends on a fact the
+            successor deleted. The remaining costs are still achievable, so they are valid upper bounds.
+            Returns None once more than `max_invalidated` of the facts are reset, as a fresh graph is
+            cheaper than finishing the invalidation at that point.
+        """
+        affected = parent.state_mask & ~state_mask
+        has_supporter = parent.supporter >= 0
+        limit = self.max_invalidated * self.num_facts
+
+        while True:
+            if np.count_nonzero(affected) > limit:
+                return None
+
+            op_affected = np.zeros(len(self.operators), dtype=bool)
+            op_affected[self.pre_op[affected[self.pre_fact]]] = True
+
+            new_affected = affected.copy()
+            new_affected[has_supporter] |= op_affected[parent.supporter[has_supporter]]
+
+            if np.array_equal(new_affected, affected):
+                break
+
+            affected = new_affected
+
+        fact_cost = parent.fact_cost.copy()
+        fact_cost[affected] = INF
+        fact_cost[state_mask] = 0.0
+
+        return fact_cost
+
+    def heuristic_value(self, fact_cost: np.ndarray, supporter: np.ndarray) -> float:
+        goal_costs = fact_cost[self.goal_facts]
+
+        if np.isinf(goal_costs).any():
+            return INF
+
+        match self.kind:
+            case "max":
+                return float(goal_costs.max(initial=0.0))
+            case "add":
+                return float(goal_costs.sum())
+            case "ff":
+                return float(self.op_cost[self.relaxed_plan(fact_cost, supporter)].sum())
+            case _:
+                raise NotImplementedError(f"Undefined heuristic {self.kind}")
+
+    def relaxed_plan(self, fact_cost: np.ndarray, supporter: np.ndarray) -> List[int]:
+        relaxed_plan = []
+        seen_ops = set()
+        open_facts = [int(g) for g in self.goal_facts if fact_cost[g] > 0]
+        seen_facts = set(open_facts)
+
+        while open_facts:
+            op_id = int(supporter[open_facts.pop()])
+            if op_id in seen_ops:
+                continue
+
+            seen_ops.add(op_id)
+            relaxed_plan.append(op_id)
+
+            for f in self.pre_fact[self.pre_ptr[op_id]:self.pre_ptr[op_id+1]]:
+                f = int(f)
+                if fact_cost[f] > 0 and f not in seen_facts:
+                    seen_facts.add(f)
+                    open_facts.append(f)
+
+        return relaxed_plan
+
+    def successors(self, bits: BitState) -> List[Tuple[GroundedAction, BitState]]:
+        return [(op, op.apply(bits)) for op in self.operators if op.applicable(bits)]
+
+def bit_indices(bits: int) -> List[int]:
+    indices = []
+
+    while bits:
+        low = bits & -bits
+        indices.append(low.bit_length() - 1)
+        bits ^= low
+
+    return indices
@@ -0,0 +1,382 @@
+import numpy as np
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Optional, NewType
+
+from pypddl.core import State
+from pypddl.grounding import Grounding, GroundedAction, BitState
+from pypddl.heuristics import bit_indices
+
+SASState = NewType("SASState", np.ndarray)
+
+def find_unbalanced(group: int, operators: List[GroundedAction]) -> Tuple[bool, Optional[GroundedAction]]:
+    """
+        Whether `group` can still be a mutex group, and the first operator that adds one of its facts
+        without deleting one it requires. Operators adding two facts of the group rule it out.
+    """
+    for op in operators:
+        added = op.add & group
+
+        if added == 0:
+            continue
+
+        if added.bit_count() > 1:
+            return False, None
+
+        if added & op.pre_pos == 0 and op.delete & op.pre_pos & group == 0:
+            return True, op
+
+    return True, None
+
+def seed_groups(grounding: Grounding, fluents: int) -> List[int]:
+    """
+        Facts of a predicate that agree on all but one argument, e.g. at(block_1, ·), and every unary fact on its own.
+    """
+    seeds: Dict[Tuple, int] = {}
+
+    for idx, (pred_name, arg_names) in enumerate(grounding.facts):
+        if not (fluents >> idx) & 1:
+            continue
+
+        keys = [(pred_name, pos, arg_names[:pos] + arg_names[pos+1:]) for pos in range(len(arg_names))]
+        if len(arg_names) <= 1:
+            keys.append((pred_name, idx))
+
+        for key in keys:
+            seeds[key] = seeds.get(key, 0) | (1 << idx)
+
+    return list(dict.fromkeys(seeds.values()))
+
+def prune_static(operators: List[GroundedAction], init: BitState) -> Tuple[List[GroundedAction], int]:
+    """
+        Operators that can still apply, and the mask of fluents. Operators are first restricted to those
+        reachable from `init` in the delete relaxation. A fact is static when no operator left changes its
+        initial value, operators requiring the opposite value are dropped until the fluents settle.
+    """
+    reached = init
+    while True:
+        reachable = [op for op in operators if op.pre_pos & ~reached == 0]
+
+        added = 0
+        for op in reachable:
+            added |= op.add
+
+        if reached | added == reached:
+            break
+
+        reached |= added
+
+    operators = reachable
+
+    while True:
+        added, deleted = 0, 0
+        for op in operators:
+            added |= op.add
+            deleted |= op.delete & ~op.add
+
+        fluents = (added & ~init) | (deleted & init)
+        static_true = init & ~fluents
+        pruned = [op for op in operators if op.pre_pos & ~fluents & ~init == 0 and op.pre_neg & static_true == 0]
+
+        if len(pruned) == len(operators):
+            return operators, fluents
+
+        operators = pruned
+
+def mutex_groups(grounding: Grounding, operators: List[GroundedAction], init: BitState, fluents: int, max_candidates: int = 5000) -> List[int]:
+    """
+        Sets of facts of which at most one holds in any reachable state, as fact masks. A candidate holds
+        at most one fact initially and every operator adding one of its facts deletes one it requires.
+        Unbalanced candidates are extended by the required facts the offending operator deletes, so
+        at(block_1, ·) picks up holding(robot, block_1). Only maximal groups are returned.
+    """
+    queue = deque(seed_groups(grounding, fluents))
+    seen = set(queue)
+    groups = []
+    checked = 0
+
+    while queue and checked < max_candidates:
+        group = queue.popleft()
+        checked += 1
+
+        if (group & init).bit_count() > 1:
+            continue
+
+        valid, op = find_unbalanced(group, operators)
+
+        if not valid:
+            continue
+
+        if op is None:
+            groups.append(group)
+            continue
+
+        for f in bit_indices(op.delete & op.pre_pos & ~group):
+            extended = group | (1 << f)
+
+            if extended not in seen:
+                seen.add(extended)
+                queue.append(extended)
+
+    return [group for group in groups if not any(group != other and group & other == group for other in groups)]
+
+def choose_variables(groups: List[int], fluents: int) -> List[int]:
+    """
+        Greedily cover the fluents with the largest mutex groups, every fact ends up in exactly one variable.
+        Facts no group of two or more covers become binary variables.
+    """
+    variables = []
+    uncovered = fluents
+
+    while True:
+        best = max(groups, key=lambda group: (group & uncovered).bit_count(), default=0)
+        covered = best & uncovered
+
+        if covered.bit_count() <= 1:
+            break
+
+        variables.append(covered)
+        uncovered &= ~covered
+
+    return variables + [1 << f for f in bit_indices(uncovered)]
+
+@dataclass
+class SASVariable:
+    # Fact indices of the grounding, value i means facts[i] holds
+    facts: List[int]
+    # Value for none of the facts holding, None when one of them always holds
+    none_value: Optional[int] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.facts) + (0 if self.none_value is None else 1)
+
+@dataclass
+class SASOperator:
+    action: GroundedAction
+
+    pre_vars: np.ndarray
+    pre_vals: np.ndarray
+    neg_vars: np.ndarray
+    neg_vals: np.ndarray
+
+    eff_vars: np.ndarray
+    eff_vals: np.ndarray
+    # Deletes of facts the operator does not require, they only take effect when the fact holds
+    del_vars: np.ndarray
+    del_vals: np.ndarray
+    del_none: np.ndarray
+
+    def applicable(self, state: SASState) -> bool:
+        return bool(np.all(state[self.pre_vars] == self.pre_vals)) and not np.any(state[self.neg_vars] == self.neg_vals)
+
+    def apply(self, state: SASState) -> SASState:
+        new_state = state.copy()
+
+        if len(self.del_vars) > 0:
+            holds = state[self.del_vars] == self.del_vals
+            new_state[self.del_vars[holds]] = self.del_none[holds]
+
+        new_state[self.eff_vars] = self.eff_vals
+        return SASState(new_state)
+
+@dataclass
+class SASTask:
+    """
+        Multi-valued (SAS+) encoding of a grounded task. Facts of a mutex group share one small-int variable,
+        so a state is a short NumPy array, e.g. one location per block and robot plus the gripper status,
+        that hashes through its bytes. Facts no operator changes are kept out of the state.
+    """
+    grounding: Grounding
+    variables: List[SASVariable]
+    operators: List[SASOperator]
+    dtype: type = np.uint8
+
+    init: SASState = field(default_factory=lambda: SASState(np.zeros(0, dtype=np.uint8)))
+    static_bits: int = 0
+    fact_values: Dict[int, Tuple[int, int]] = field(default_factory=lambda: {})
+    goal_vars: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    goal_vals: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    goal_static: bool = True
+
+    # Flat precondition arrays over all operators, for checking them against a state in one pass
+    pre_op: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    pre_var: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    pre_val: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    pre_count: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    neg_op: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    neg_var: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    neg_val: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+
+    def __post_init__(self):
+        pre_op, pre_var, pre_val, neg_op, neg_var, neg_val = [], [], [], [], [], []
+
+        for op_id, op in enumerate(self.operators):
+            pre_op.extend([op_id] * len(op.pre_vars))
+            pre_var.extend(op.pre_vars.tolist())
+            pre_val.extend(op.pre_vals.tolist())
+            neg_op.extend([op_id] * len(op.neg_vars))
+            neg_var.extend(op.neg_vars.tolist())
+            neg_val.extend(op.neg_vals.tolist())
+
+        self.pre_op = np.array(pre_op, dtype=np.int64)
+        self.pre_var = np.array(pre_var, dtype=np.int64)
+        self.pre_val = np.array(pre_val, dtype=np.int64)
+        self.pre_count = np.array([len(op.pre_vars) for op in self.operators], dtype=np.int64)
+        self.neg_op = np.array(neg_op, dtype=np.int64)
+        self.neg_var = np.array(neg_var, dtype=np.int64)
+        self.neg_val = np.array(neg_val, dtype=np.int64)
+
+    def from_bits(self, bits: BitState) -> SASState:
+        state = np.empty(len(self.variables), dtype=self.dtype)
+
+        for var_id, var in enumerate(self.variables):
+            held = [val for val, f in enumerate(var.facts) if (bits >> f) & 1]
+            assert len(held) == 1 or (held == [] and var.none_value is not None), f"State breaks the mutex group of variable {var_id}"
+
+            state[var_id] = held[0] if held else var.none_value
+
+        return SASState(state)
+
+    def to_bits(self, state: SASState) -> BitState:
+        bits = self.static_bits
+
+        for var, val in zip(self.variables, state.tolist()):
+            if val < len(var.facts):
+                bits |= 1 << var.facts[val]
+
+        return BitState(bits)
+
+    def encode(self, state: State) -> SASState:
+        return self.from_bits(self.grounding.encode(state))
+
+    def decode(self, state: SASState) -> State:
+        return self.grounding.decode(self.to_bits(state))
+
+    def key(self, state: SASState) -> bytes:
+        return state.tobytes()
+
+    def holds(self, state: SASState, pred_name: str, arg_names: Tuple[str, ...]) -> bool:
+        idx = self.grounding.fact_index[(pred_name, arg_names)]
+
+        if idx not in self.fact_values:
+            return bool((self.static_bits >> idx) & 1)
+
+        var_id, val = self.fact_values[idx]
+        return int(state[var_id]) == val
+
+    def applicable(self, state: SASState) -> np.ndarray:
+        """
+            Indices of the operators applicable in `state`, all preconditions are checked in one vectorized pass.
+        """
+        holds = state[self.pre_var] == self.pre_val
+        applicable = np.bincount(self.pre_op[holds], minlength=len(self.operators)) == self.pre_count
+
+        if len(self.neg_op) > 0:
+            applicable &= np.bincount(self.neg_op[state[self.neg_var] == self.neg_val], minlength=len(self.operators)) == 0
+
+        return np.flatnonzero(applicable)
+
+    def successors(self, state: SASState) -> List[Tuple[GroundedAction, SASState]]:
+        return [(self.operators[i].action, self.operators[i].apply(state)) for i in self.applicable(state)]
+
+    def goal_reached(self, state: SASState) -> bool:
+        return self.goal_static and bool(np.all(state[self.goal_vars] == self.goal_vals))
+
+def always_holds_one(group: int, operators: List[GroundedAction], init: BitState) -> bool:
+    # Exactly one fact holds initially and every operator deleting one adds another
+    return (group & init).bit_count() == 1 and all(op.add & group for op in operators if op.delete & ~op.add & group)
+
+def index_arrays(pairs: List[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray]:
+    return np.array([p[0] for p in pairs], dtype=np.int64), np.array([p[1] for p in pairs], dtype=np.int64)
+
+def translate_operator(op: GroundedAction, fact_values: Dict[int, Tuple[int, int]], variables: List[SASVariable]) -> Optional[SASOperator]:
+    """
+        Preconditions and effects of `op` as (variable, value) pairs, None when two preconditions contradict.
+        Static facts are left out, operators contradicting them are pruned beforehand.
+    """
+    pre: Dict[int, int] = {}
+    neg = []
+
+    for f in bit_indices(op.pre_pos):
+        if f not in fact_values:
+            continue
+
+        var_id, val = fact_values[f]
+        if pre.setdefault(var_id, val) != val:
+            return None
+
+    for f in bit_indices(op.pre_neg):
+        if f not in fact_values:
+            continue
+
+        var_id, val = fact_values[f]
+
+        # A positive precondition on the same variable already rules the fact out, as for move's target pose
+        if var_id in pre:
+            if pre[var_id] == val:
+                return None
+            continue
+
+        neg.append((var_id, val))
+
+    effects = {fact_values[f][0]: fact_values[f][1] for f in bit_indices(op.add) if f in fact_values}
+    deletes = []
+
+    for f in bit_indices(op.delete & ~op.add):
+        if f not in fact_values or fact_values[f][0] in effects:
+            continue
+
+        var_id, val = fact_values[f]
+        none_value = variables[var_id].none_value
+
+        if pre.get(var_id) == val:
+            effects[var_id] = none_value
+        else:
+            deletes.append((var_id, val, none_value))
+
+    pre_vars, pre_vals = index_arrays(list(pre.items()))
+    neg_vars, neg_vals = index_arrays(neg)
+    eff_vars, eff_vals = index_arrays(list(effects.items()))
+    del_vars, del_vals = index_arrays([(d[0], d[1]) for d in deletes])
+    del_none = np.array([d[2] for d in deletes], dtype=np.int64)
+
+    return SASOperator(op, pre_vars, pre_vals, neg_vars, neg_vals, eff_vars, eff_vals, del_vars, del_vals, del_none)
+
+def translate(grounding: Grounding, operators: List[GroundedAction], init: BitState, max_candidates: int = 5000) -> SASTask:
+    """
+        SAS+ task from a grounding and its grounded operators, e.g. `ground_operators(grounding, [move, grasp, place])`.
+    """
+    operators, fluents = prune_static(operators, init)
+    groups = mutex_groups(grounding, operators, init, fluents, max_candidates)
+    variables = []
+    fact_values = {}
+
+    for group in choose_variables(groups, fluents):
+        facts = bit_indices(group)
+        var = SASVariable(facts, None if always_holds_one(group, operators, init) else len(facts))
+
+        for val, f in enumerate(facts):
+            fact_values[f] = (len(variables), val)
+
+        variables.append(var)
+
+    static_bits = init & ~fluents
+
+    sas_operators = []
+    for op in operators:
+        sas_op = translate_operator(op, fact_values, variables)
+
+        if sas_op is not None:
+            sas_operators.append(sas_op)
+
+    dtype = np.uint8 if max((var.size for var in variables), default=0) <= 2**8 else np.uint16
+    task = SASTask(grounding, variables, sas_operators, dtype, static_bits=static_bits, fact_values=fact_values)
+    task.init = task.from_bits(init)
+
+    goal_facts = bit_indices(grounding.goal_mask)
+    task.goal_vars, task.goal_vals = index_arrays([fact_values[f] for f in goal_facts if f in fact_values])
+    task.goal_static = all((static_bits >> f) & 1 for f in goal_facts if f not in fact_values)
+
+    return task
@@ -3,6 +3,10 @@ from dataclasses import dataclass
 from pypddl.block_domain import at, gripper_empty, at_top, holding, clear, pose_supported, At
 from pypddl.block_domain import Block, Robot, move, grasp, place
 from pddl_parser.problem_parser import parse_config_to_states
+from pypddl.core import States, State
+from pddl_parser.pddl_parser import PddlProblemParser
+from planners.solver import load_domain, solve_problem
+from dispatcher.validation import validate_plan
 
 from d_lgp.dynamic_logic_geometric_programmer import dynamic_tree_search, successor_dagger, resolve_conflicts, conflict_driven_task_graph
 
@@ -58,5 +62,28 @@ def test():
     # results = place(states.current_state, robot=robot, object=block_2, target_pose=block_2.goal_pose)
     # states.update_states(results.new_state)
 
+def test_state_history_replaced_key():
+    # The same number of entries with one key swapped for another must not bring the old key back
+    s0 = State({'at': {('robot', 'p0'): True}})
+    s1 = State({'at': {('robot', 'p1'): True}})
+    s2 = State({'at': {('robot', 'p2'): True}})
+    states = States({}, {}, s0, [s0, s1, s2, s2], State({}))
+
+    assert [dict(states.states[i]['at']) for i in range(4)] == [s0['at'], s1['at'], s2['at'], s2['at']]
+
+def test_validate_plan_jobs():
+    pp = PddlProblemParser('basic', 'blocks')
+    plan = solve_problem(load_domain('blocks'), pp.define_problem('basic'), solver='gbfs', time_limit=60).plan
+    kwargs = {"drive_robot": False}
+
+    # Jobs without goal predicates only check the execution
+    assert validate_plan((pp.init_predicates, pp.positions, plan), kwargs).success
+    assert validate_plan((pp.init_predicates, pp.positions, plan[:-1]), kwargs).success
+
+    assert validate_plan((pp.init_predicates, pp.positions, plan, pp.goal_predicates), kwargs).success
+    assert not validate_plan((pp.init_predicates, pp.positions, plan[:-1], pp.goal_predicates), kwargs).success
+
 if __name__ == "__main__":
-    test()
\ No newline at end of file
+    test()
+    test_state_history_replaced_key()
+    test_validate_plan_jobs()
\ No newline at end of file